@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+This is the production entry point (gunicorn with uvicorn workers, see the Dockerfile).
+The /api/events/ server-sent event stream is an async view and is only served through this entry point,
+under WSGI it answers 503 and the Store OS falls back to polling.
 """
 
 import os
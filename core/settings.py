@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory.middleware.MetricsMiddleware', #-- first, so its timing covers every other middleware too
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -64,6 +65,7 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory.middleware.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -94,8 +96,7 @@ WSGI_APPLICATION = 'core.wsgi.application'
 if os.environ.get('DATABASE_URL'):
     DATABASES = {
         'default': dj_database_url.config(
-            default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600
+            default=os.environ.get('DATABASE_URL')
         )
     }
 
@@ -120,6 +121,41 @@ else:
     }
 }
 
+#-- optional read replica: reports, exports and list screens read from it (inventory.routers), the tills never do
+#-- DB_REPLICA_PIN_SECONDS: after a write, that browser keeps reading from the primary this long (read your own writes)
+if os.environ.get('DB_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.environ['DB_REPLICA_URL'])
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['inventory.routers.ReadReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10))
+
+#-- connection handling, the same for both postgres branches above (and the replica)
+#-- DB_POOL=True (default): a psycopg 3 pool in every worker process, no connect handshake per request
+#-- DB_PGBOUNCER=True: PgBouncer in transaction pooling mode does the pooling, so consecutive transactions may land on
+#-- different server connections: no server side cursors for .iterator() (prepared statements are already off in django)
+#-- DB_POOL=False: plain persistent connections, kept for DB_CONN_MAX_AGE seconds
+for _db in DATABASES.values():
+    if _db['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    _db.setdefault('OPTIONS', {})
+    _db['CONN_HEALTH_CHECKS'] = True
+
+    if os.environ.get('DB_PGBOUNCER') == 'True':
+        _db['DISABLE_SERVER_SIDE_CURSORS'] = True
+        _db['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+
+    elif os.environ.get('DB_POOL', 'True') == 'True':
+        _db['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)), #-- per worker process
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)), #-- seconds to wait for a free connection
+        }
+        _db['CONN_MAX_AGE'] = 0 #-- the pool owns connection reuse, django refuses both at once
+
+    else:
+        _db['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -174,5 +210,34 @@ REST_FRAMEWORK = {
     #-- we can add Rate Limiting here later
 }
 
+#-- InventoryLog rows older than this are moved to the monthly archive by `manage.py archive_inventory_logs`
+INVENTORY_LOG_RETENTION_DAYS = int(os.environ.get('INVENTORY_LOG_RETENTION_DAYS', 365))
+
+#-- StoreSettings.load() caches the singleton this long. Saving clears it in the saving process straight away,
+#-- other processes pick the change up when their copy expires (immediately if CACHES points at a shared cache)
+STORE_SETTINGS_CACHE_SECONDS = int(os.environ.get('STORE_SETTINGS_CACHE_SECONDS', 300))
+
+#-- how often each server process checks for new notifications / stock movements to push down /api/events/
+INVENTORY_EVENT_POLL_SECONDS = float(os.environ.get('INVENTORY_EVENT_POLL_SECONDS', 2))
+#-- how long a skipped id is looked for again, i.e the longest sale/stocktake transaction whose events still get pushed
+INVENTORY_EVENT_LATE_COMMIT_SECONDS = float(os.environ.get('INVENTORY_EVENT_LATE_COMMIT_SECONDS', 60))
+
+#-- /metrics/ is open to managers' sessions, and to a scraper sending "Authorization: Bearer <METRICS_TOKEN>" if set
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '{asctime} {levelname} {name}: {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'inventory': {'handlers': ['console'], 'level': os.environ.get('INVENTORY_LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
 LOGIN_REDIRECT_URL = '/' #--redirect to homepage on login
 LOGOUT_REDIRECT_URL = '/login/' #-- on sign out, got to login 
\ No newline at end of file
@@ -1,12 +1,15 @@
+from decimal import Decimal
+
+from django import forms
 from django.contrib import admin
 from django.http import FileResponse
 
 from .models import (
     Product, ProductVariant, Order, OrderItem, InventoryLog,
     Promotion, Supplier, PurchaseOrder, PurchaseOrderItem, Notification, StoreSettings, StocktakeSession, StocktakeItem,
-    Customer
+    Customer, WalletTransaction
 )
-from .services import receive_purchase_order
+from .services import receive_purchase_order, record_wallet_deposit
 from .utils import generate_barcode_pdf
 
 
@@ -71,10 +74,56 @@ class PurchaseOrderItemInline(admin.TabularInline):
     extra = 1
 
 
+class CustomerAdminForm(forms.ModelForm):
+    #-- the balance is read only, money paid in (debt repayment / top up) is recorded through the wallet ledger
+    deposit_amount = forms.DecimalField(
+        required=False, max_digits=12, decimal_places=2, min_value=Decimal('0.01'),
+        help_text="Money the customer paid in (debt repayment or store credit top up). Added to the wallet balance."
+    )
+    deposit_note = forms.CharField(required=False, max_length=255)
+
+    class Meta:
+        model = Customer
+        fields = '__all__'
+
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
+    form = CustomerAdminForm
     list_display = ['name', 'phone', 'wallet_balance', 'created_at']
     search_fields = ['name', 'phone']
+    #-- the balance only moves through the wallet ledger, the rest are aggregates kept by the sales and refunds
+    readonly_fields = ['wallet_balance', 'lifetime_value', 'order_count', 'last_visit_at',
+                       'debt_0_30', 'debt_31_60', 'debt_over_60', 'debt_aged_at']
+    fieldsets = [
+        (None, {'fields': ['name', 'phone', 'email', 'address']}),
+        ('Wallet', {'fields': ['wallet_balance', 'deposit_amount', 'deposit_note']}),
+        ('History', {'fields': ['lifetime_value', 'order_count', 'last_visit_at',
+                                'debt_0_30', 'debt_31_60', 'debt_over_60', 'debt_aged_at']}),
+    ]
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            #-- only the edited columns, a full save would write back the balance read when the page was loaded
+            obj.save(update_fields=[name for name in form.changed_data if name not in ('deposit_amount', 'deposit_note')])
+        else:
+            obj.save()
+        amount = form.cleaned_data.get('deposit_amount')
+        if amount:
+            record_wallet_deposit(request.user, obj.id, amount, form.cleaned_data.get('deposit_note') or "")
+            obj.refresh_from_db(fields=['wallet_balance'])
+            self.message_user(request, f"Recorded a deposit of {amount} for {obj.name}")
+
+
+@admin.register(WalletTransaction)
+class WalletTransactionAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'kind', 'amount', 'balance_after', 'order', 'user', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['customer__name', 'customer__phone']
+    raw_id_fields = ['customer', 'order']
+
+    def has_change_permission(self, request, obj=None):
+        return False #-- append only
 
 
 class StocktakeItemInline(admin.TabularInline):
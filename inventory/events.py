@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max, Q
+
+from .models import InventoryLog, Notification
+from .serializers import NotificationSerializer
+
+#-- rows read per poll, a burst bigger than this (e.g a stocktake approval) just drains over the next polls
+EVENT_BATCH_SIZE = 500
+
+#-- most skipped ids followed per jump, a bigger jump is a huge in-flight batch and only its tail is followed
+MAX_TRACKED_GAP = 5000
+
+logger = logging.getLogger(__name__)
+
+
+class CommitCursor:
+    """
+    Reads the rows of a table added since the last read, by id, without losing rows that commit out of id order.
+
+    Ids are handed out at INSERT, not at commit: a sale can get id 101 and commit after id 102 was already read.
+    So the ids we jump over are remembered and looked up again on every read until they show up
+    or `late_commit_seconds` pass (rolled back transactions leave holes that never fill).
+    """
+
+    def __init__(self, late_commit_seconds):
+        self.late_commit_seconds = late_commit_seconds
+        self.last_id = 0
+        self.gaps = {} #-- skipped id -> time we first missed it
+
+    def reset(self, last_id):
+        self.last_id = last_id or 0
+        self.gaps = {}
+
+    def read(self, queryset, key=lambda row: row.id):
+        now = time.monotonic()
+        self.gaps = {row_id: missed_at for row_id, missed_at in self.gaps.items()
+                     if now - missed_at < self.late_commit_seconds}
+
+        condition = Q(id__gt=self.last_id)
+        if self.gaps:
+            condition |= Q(id__in=list(self.gaps))
+        rows = list(queryset.filter(condition).order_by('id')[:EVENT_BATCH_SIZE])
+
+        for row in rows:
+            row_id = key(row)
+            if row_id in self.gaps:
+                del self.gaps[row_id] #-- committed late, delivered now
+            elif row_id > self.last_id:
+                for skipped in range(max(self.last_id + 1, row_id - MAX_TRACKED_GAP), row_id):
+                    self.gaps[skipped] = now
+                self.last_id = row_id
+        return rows
+
+
+class EventBroker:
+    """
+    Fans new Notification rows and stock changes out to every open event stream in this process.
+
+    One poller per process reads "anything newer than the last id I saw" from the two tables and pushes
+    the events into each subscriber's queue, so hundreds of open tabs cost one cheap primary key seek
+    per interval instead of one query per tab. The poller starts with the first subscriber and stops
+    with the last one.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'INVENTORY_EVENT_POLL_SECONDS', 2)
+        late_commit_seconds = getattr(settings, 'INVENTORY_EVENT_LATE_COMMIT_SECONDS', 60)
+        self.subscribers = set()
+        self.task = None
+        self.notifications = CommitCursor(late_commit_seconds)
+        self.logs = CommitCursor(late_commit_seconds)
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def run(self):
+        await sync_to_async(self.with_connection)(self.reset_cursors)
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                events = await sync_to_async(self.with_connection)(self.poll)
+            except Exception as e:
+                #-- a db hiccup should not kill the stream for everyone, try again next tick
+                logger.warning("Event poll failed: %s", e)
+                continue
+            for queue in list(self.subscribers):
+                for event in events:
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        #-- a client that stopped reading should not hold up the others, it will reconnect
+                        self.unsubscribe(queue)
+                        break
+
+    def with_connection(self, func):
+        """
+        Runs one poll like a request: a checked connection before, handed back (to the pool) after,
+        and thrown away after a database error so a dropped connection cannot fail every later tick.
+        """
+        if connection.in_atomic_block:
+            return func() #-- this thread is inside a transaction (e.g a test case), its connection is not ours to close
+        close_old_connections()
+        try:
+            return func()
+        except Exception:
+            connection.close()
+            raise
+        finally:
+            close_old_connections()
+
+    def reset_cursors(self):
+        #-- only stream what happens from now on, clients load the current state with a normal GET first
+        self.notifications.reset(Notification.objects.aggregate(last=Max('id'))['last'])
+        self.logs.reset(InventoryLog.objects.aggregate(last=Max('id'))['last'])
+
+    def poll(self):
+        events = []
+
+        notifications = self.notifications.read(Notification.objects.all())
+        if notifications:
+            events.extend(('notification', data) for data in NotificationSerializer(notifications, many=True).data)
+
+        logs = self.logs.read(
+            InventoryLog.objects.values_list('id', 'variant_id', 'variant__sku', 'stock_after'), key=lambda row: row[0]
+        )
+        if logs:
+            #-- several movements of the same variant collapse into its latest level
+            latest = {variant_id: (sku, stock_after) for _, variant_id, sku, stock_after in logs}
+            events.extend(
+                ('stock', {"variant_id": variant_id, "sku": sku, "stock_quantity": stock_after})
+                for variant_id, (sku, stock_after) in latest.items()
+            )
+
+        return events
+
+
+broker = EventBroker()
+
+
+def format_event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def event_stream(keepalive=15):
+    """
+    Subscribes to the broker and yields server-sent events, with a comment line every `keepalive` seconds
+    so proxies do not close an idle connection. Unsubscribes when the client disconnects.
+    """
+    queue = broker.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            if queue not in broker.subscribers and queue.empty():
+                return #-- dropped for falling behind, the browser reconnects on its own
+            try:
+                name, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(name, data)
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,40 @@
+from .models import InventoryLog
+
+#-- rows per INSERT when flushing, keeps each statement a sane size on very big batches (stocktakes)
+LOG_BATCH_SIZE = 1000
+
+
+class InventoryLogWriter:
+    """
+    Collects the InventoryLog rows produced inside a transaction and writes them with one bulk_create,
+    so logging costs the same whether a sale has 1 line or 300.
+
+    Open it inside the transaction.atomic() block, it flushes when the block exits cleanly,
+    i.e. just before the commit. On an exception nothing is written and the transaction rolls back as usual.
+
+        with transaction.atomic(), InventoryLogWriter() as logs:
+            ...
+            logs.add(variant=variant, user=user, action='sale', quantity_change=-qty, stock_after=..., note=...)
+    """
+
+    def __init__(self, batch_size=LOG_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.entries = []
+
+    def add(self, **fields):
+        self.entries.append(InventoryLog(**fields))
+
+    def flush(self):
+        if self.entries:
+            InventoryLog.objects.bulk_create(self.entries, batch_size=self.batch_size)
+        self.entries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.entries = []
+        return False
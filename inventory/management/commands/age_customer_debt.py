@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import age_customer_debt
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the 0-30 / 31-60 / 60+ day debt buckets of every customer from the wallet ledger (run nightly)'
+
+    def handle(self, *args, **options):
+        result = age_customer_debt()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully aged debt for {result["debtors"]} debtors ({result["cleared"]} cleared)'
+        ))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.services import LOG_ARCHIVE_BATCH_SIZE, archive_inventory_logs, get_log_archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Moves inventory logs older than the retention horizon into the monthly archive (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.INVENTORY_LOG_RETENTION_DAYS,
+                            help='Keep this many days of logs in the hot table (default: INVENTORY_LOG_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=LOG_ARCHIVE_BATCH_SIZE,
+                            help='Rows moved per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = get_log_archive_cutoff(options['days'])
+        self.stdout.write(f"Archiving inventory logs older than {cutoff:%Y-%m-%d}")
+
+        moved = archive_inventory_logs(options['days'], options['batch_size'])
+
+        for month, count in moved.items():
+            self.stdout.write(f"{month:%Y-%m}: {count} rows archived")
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully archived {sum(moved.values())} inventory logs!'))
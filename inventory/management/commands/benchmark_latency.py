@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.utils import latency_summary
+
+#-- what a till does all day, each reader cycles through these
+HOT_READS = [
+    ('scan', 'api/scan/{barcode}/'),
+    ('products', 'api/products/?search={search}'),
+    ('customers', 'api/customers/?search={phone}'),
+    ('notifications', 'api/notifications/'),
+]
+
+#-- the slow requests that used to tie up sync workers
+SLOW_REQUESTS = [
+    ('export_inventory', 'api/export/inventory/'),
+    ('barcode_pdf', 'api/print-labels/'),
+]
+
+
+def login(base_url, username, password):
+    #-- session + csrftoken cookies of a logged in user, through the real login form
+    session = requests.Session()
+    login_url = urljoin(base_url, 'login/')
+    session.get(login_url, timeout=30) #-- sets the csrftoken cookie
+    response = session.post(login_url, data={
+        'username': username,
+        'password': password,
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+    }, headers={'Referer': login_url}, timeout=30)
+    if 'sessionid' not in session.cookies:
+        raise CommandError(f"Login failed for {username} (HTTP {response.status_code})")
+    return session.cookies.get_dict()
+
+
+class Command(BaseCommand):
+    help = ('Measures tail latency of the till\'s hot reads while exports and PDFs run alongside, against a running server. '
+            'Run it once against the WSGI server and once against the ASGI one and compare the p95/p99')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/')
+        parser.add_argument('--username', required=True, help='a manager account, the exports are manager only')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+        parser.add_argument('--readers', type=int, default=20, help='concurrent tills doing hot reads')
+        parser.add_argument('--slow', type=int, default=4, help='concurrent clients pulling exports / PDFs')
+        parser.add_argument('--barcode', help='barcode to scan, defaults to the first product')
+        parser.add_argument('--json', action='store_true', help='print machine readable results only')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/') + '/'
+        cookies = login(base_url, options['username'], options['password'])
+
+        barcode = options['barcode'] or self.first_barcode(base_url, cookies)
+        params = {'barcode': barcode, 'search': barcode[:3], 'phone': '080'}
+
+        samples = {name: [] for name, _ in HOT_READS + SLOW_REQUESTS}
+        errors = {name: 0 for name in samples}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker(requests_to_make, offset):
+            session = requests.Session()
+            session.cookies.update(cookies)
+            i = offset
+            while time.monotonic() < deadline:
+                name, path = requests_to_make[i % len(requests_to_make)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    ok = session.get(urljoin(base_url, path.format(**params)), timeout=120).status_code < 400
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    samples[name].append(elapsed)
+                    errors[name] += 0 if ok else 1
+
+        with ThreadPoolExecutor(max_workers=options['readers'] + options['slow']) as pool:
+            for n in range(options['readers']):
+                pool.submit(worker, HOT_READS, n)
+            for n in range(options['slow']):
+                pool.submit(worker, SLOW_REQUESTS, n)
+
+        hot = [sample for name, _ in HOT_READS for sample in samples[name]]
+        results = {
+            "base_url": base_url,
+            "duration_s": options['duration'],
+            "readers": options['readers'],
+            "slow_clients": options['slow'],
+            "hot_reads": {**latency_summary(hot), "rps": round(len(hot) / options['duration'], 1)},
+            "endpoints": {name: {**latency_summary(samples[name]), "errors": errors[name]} for name in samples},
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'endpoint':<18}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<18}{row['count']:>8}{row['errors']:>8}{row['p50_ms'] or '-':>10}{row['p95_ms'] or '-':>10}"
+                f"{row['p99_ms'] or '-':>10}{row['max_ms'] or '-':>10}"
+            )
+        hot = results['hot_reads']
+        self.stdout.write(self.style.SUCCESS(
+            f"Hot reads: {hot['rps']} req/s, p50 {hot['p50_ms']} ms, p95 {hot['p95_ms']} ms, p99 {hot['p99_ms']} ms"
+        ))
+
+    def first_barcode(self, base_url, cookies):
+        products = requests.get(urljoin(base_url, 'api/products/'), cookies=cookies, timeout=30).json()
+        if not products:
+            raise CommandError("No products to scan, seed some first or pass --barcode")
+        return products[0]['barcode']
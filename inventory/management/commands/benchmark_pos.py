@@ -0,0 +1,356 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urljoin
+
+import requests
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from inventory.log_writer import InventoryLogWriter
+from inventory.models import Order, OrderItem, Product, ProductVariant
+from inventory.pricing import calculate_dynamic_price
+from inventory.services import get_product_by_barcode, process_purchase, process_refund
+from inventory.utils import latency_summary
+
+from .benchmark_latency import login
+
+OPERATIONS = ('scan', 'price', 'purchase', 'refund')
+
+#-- postgres sqlstates we count separately, the rest of a failed call is just an "error"
+DEADLOCK_SQLSTATE = '40P01'
+LOCK_SQLSTATES = {'55P03', '40001'} #-- lock_not_available, serialization_failure
+
+
+def classify_failure(message, sqlstate=None):
+    #-- works on the exception text too, over HTTP the view only hands us str(e)
+    message = message.lower()
+    if sqlstate == DEADLOCK_SQLSTATE or 'deadlock' in message:
+        return 'deadlock'
+    if sqlstate in LOCK_SQLSTATES or 'database is locked' in message or 'could not serialize' in message:
+        return 'lock_timeout'
+    if 'not enough stock' in message:
+        return 'out_of_stock'
+    return 'error'
+
+
+class Recorder:
+    #-- shared by all cashier threads: latency of every call (failed ones too, the till waited for them) and its outcome
+    def __init__(self):
+        self.samples = {operation: [] for operation in OPERATIONS}
+        self.outcomes = {operation: {} for operation in OPERATIONS}
+        self.lock_waits = []
+        self.lock = threading.Lock()
+
+    def record(self, operation, elapsed, outcome):
+        with self.lock:
+            self.samples[operation].append(elapsed)
+            self.outcomes[operation][outcome] = self.outcomes[operation].get(outcome, 0) + 1
+
+    def count(self, outcome):
+        return sum(outcomes.get(outcome, 0) for outcomes in self.outcomes.values())
+
+
+class LockTimer:
+    """
+    Execute wrapper timing the SELECT ... FOR UPDATE statements of one cashier's connection.
+    On postgres those return as soon as the row lock is granted, so their time is the wait for another till.
+    SQLite has no row locks (the SQL carries no FOR UPDATE), it serialises writers and fails with "database is locked".
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'FOR UPDATE' not in sql:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.recorder.lock:
+                self.recorder.lock_waits.append(elapsed)
+
+
+class Command(BaseCommand):
+    help = ('Load tests the till: seeds a benchmark catalog and runs concurrent simulated cashiers that scan, price, '
+            'sell and refund, either through the services directly or over HTTP against a running server. '
+            'Reports sales/s, latency percentiles, lock waits, deadlocks and oversells. '
+            'It writes real orders and stock movements, run it against a scratch database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['service', 'http'], default='service',
+                            help='service: call process_purchase/process_refund in threads, http: go through the API')
+        parser.add_argument('--cashiers', type=int, default=8, help='concurrent simulated tills')
+        parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+        parser.add_argument('--products', type=int, default=500, help='variants in the benchmark catalog')
+        parser.add_argument('--stock', type=int, default=1000, help='stock each variant is reset to before the run')
+        parser.add_argument('--hot-items', type=int, default=10,
+                            help='best sellers, half of all scanned lines come from these, this is where tills collide')
+        parser.add_argument('--max-lines', type=int, default=4, help='most distinct items in one sale')
+        parser.add_argument('--refund-rate', type=float, default=0.05, help='share of sales followed by a return')
+        parser.add_argument('--prefix', default='BENCH', help='barcode/sku prefix of the seeded catalog')
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/')
+        parser.add_argument('--username', help='cashier account, required for --mode http, '
+                                               'service mode defaults to a "benchmark_cashier" user')
+        parser.add_argument('--password')
+        parser.add_argument('--label', default='', help='free text copied into the results, e.g a git sha')
+        parser.add_argument('--json', action='store_true', help='print machine readable results only')
+
+    def handle(self, *args, **options):
+        if options['hot_items'] > options['products']:
+            raise CommandError("--hot-items cannot be more than --products")
+        if options['mode'] == 'http' and not (options['username'] and options['password']):
+            raise CommandError("--mode http needs --username and --password")
+
+        user = self.get_cashier(options)
+        barcodes = self.seed_catalog(options['prefix'], options['products'], options['stock'], user)
+        hot, rest = barcodes[:options['hot_items']], barcodes[options['hot_items']:] or barcodes
+
+        def cart(rng):
+            lines = {}
+            for _ in range(rng.randint(1, options['max_lines'])):
+                barcode = rng.choice(hot if hot and rng.random() < 0.5 else rest)
+                lines[barcode] = rng.randint(1, 3)
+            return list(lines.items()) #-- scan order, not sorted, like a real till
+
+        recorder = Recorder()
+        started_at = timezone.now()
+        stop_sampler = threading.Event()
+        blocked = []
+
+        if options['mode'] == 'http':
+            base_url = options['base_url'].rstrip('/') + '/'
+            cookies = login(base_url, options['username'], options['password'])
+            cashier = lambda n: self.run_http_cashier(base_url, cookies, cart, options['refund_rate'], deadline, recorder)
+        else:
+            cashier = lambda n: self.run_service_cashier(user, cart, options['refund_rate'], deadline, recorder)
+
+        run_started = time.monotonic()
+        deadline = run_started + options['duration']
+        with ThreadPoolExecutor(max_workers=options['cashiers'] + 1) as pool:
+            sampler = pool.submit(self.sample_blocked_sessions, stop_sampler, blocked)
+            tills = [pool.submit(cashier, n) for n in range(options['cashiers'])]
+            try:
+                for till in tills:
+                    till.result() #-- re-raises anything unexpected from a cashier thread
+            finally:
+                stop_sampler.set()
+            sampler.result()
+
+        #-- wall time, the last sales finish a little after the deadline
+        elapsed = round(time.monotonic() - run_started, 2)
+        completed = recorder.outcomes['purchase'].get('ok', 0)
+        results = {
+            "label": options['label'],
+            "mode": options['mode'],
+            "database": connection.vendor,
+            "cashiers": options['cashiers'],
+            "duration_s": elapsed,
+            "catalog": {"products": options['products'], "hot_items": options['hot_items'], "stock": options['stock']},
+            "sales": {"completed": completed, "per_second": round(completed / elapsed, 1)},
+            "operations": {
+                operation: {**latency_summary(recorder.samples[operation]), "outcomes": recorder.outcomes[operation]}
+                for operation in OPERATIONS
+            },
+            #-- service mode only, over HTTP the locks are taken inside the server
+            "lock_waits": ({**latency_summary(recorder.lock_waits), "total_s": round(sum(recorder.lock_waits), 2)}
+                           if options['mode'] == 'service' else None),
+            #-- postgres only, sessions waiting on a lock, sampled every 100ms
+            "blocked_sessions": ({"max": max(blocked, default=0),
+                                  "avg": round(sum(blocked) / len(blocked), 2) if blocked else 0}
+                                 if connection.vendor == 'postgresql' else None),
+            "deadlocks": recorder.count('deadlock'),
+            "lock_timeouts": recorder.count('lock_timeout'),
+            "out_of_stock": recorder.count('out_of_stock'),
+            "errors": recorder.count('error'),
+            "stock_check": self.check_stock(barcodes, options['stock'], user, started_at),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.print_report(results)
+
+        check = results['stock_check']
+        if check['oversold_variants'] or check['mismatched_variants']:
+            raise CommandError(f"Stock is inconsistent after the run: {check}")
+
+    def get_cashier(self, options):
+        if options['username']:
+            try:
+                return User.objects.get(username=options['username'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['username']} not found")
+        user, created = User.objects.get_or_create(username='benchmark_cashier')
+        if created:
+            user.set_unusable_password()
+            user.save()
+        return user
+
+    def seed_catalog(self, prefix, size, stock, user):
+        #-- idempotent: creates whatever part of the catalog is missing, then resets every variant to `stock`
+        barcodes = [f"{prefix}{i:06d}" for i in range(size)]
+        existing = set(ProductVariant.objects.filter(barcode__in=barcodes).values_list('barcode', flat=True))
+        missing = [barcode for barcode in barcodes if barcode not in existing]
+        if missing:
+            products = Product.objects.bulk_create(
+                [Product(name=f"Benchmark item {barcode}", category='Benchmark') for barcode in missing], batch_size=1000
+            )
+            ProductVariant.objects.bulk_create([
+                ProductVariant(product=product, sku=barcode, barcode=barcode, name_suffix='Standard',
+                               price=Decimal(50 * (1 + i % 40)), cost_price=Decimal(35 * (1 + i % 40)), stock_quantity=0)
+                for i, (product, barcode) in enumerate(zip(products, missing))
+            ], batch_size=1000)
+
+        #-- logged as a count correction so stock history / as-of reports still add up
+        with transaction.atomic(), InventoryLogWriter() as logs:
+            changed = []
+            for variant in ProductVariant.objects.select_for_update().filter(barcode__in=barcodes).order_by('id'):
+                if variant.stock_quantity != stock:
+                    logs.add(variant=variant, user=user, action='audit', quantity_change=stock - variant.stock_quantity,
+                             stock_after=stock, note="Benchmark stock reset")
+                    variant.stock_quantity = stock
+                    changed.append(variant)
+            ProductVariant.objects.bulk_update(changed, ['stock_quantity'], batch_size=1000)
+
+        self.stderr.write(f"Catalog ready: {size} variants ({len(missing)} created), stock reset to {stock}")
+        return barcodes
+
+    def timed(self, recorder, operation, func, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result, outcome = func(*args, **kwargs), 'ok'
+        except (ValidationError, DatabaseError) as e:
+            result, outcome = None, classify_failure(str(e), getattr(e.__cause__, 'sqlstate', None))
+        recorder.record(operation, time.perf_counter() - started, outcome)
+        return result
+
+    def run_service_cashier(self, user, cart, refund_rate, deadline, recorder):
+        rng = random.Random()
+        sales = [] #-- (order id, a barcode on it) still refundable
+        try:
+            with connection.execute_wrapper(LockTimer(recorder)):
+                while time.monotonic() < deadline:
+                    lines = cart(rng)
+                    for barcode, qty in lines:
+                        variant = self.timed(recorder, 'scan', get_product_by_barcode, barcode)
+                        if variant is not None:
+                            self.timed(recorder, 'price', calculate_dynamic_price, variant, qty)
+
+                    order = self.timed(recorder, 'purchase', process_purchase, user, 'cash',
+                                       [{'barcode': barcode, 'quantity': qty} for barcode, qty in lines])
+                    if order is not None:
+                        sales.append((order.id, lines[0][0]))
+
+                    if sales and rng.random() < refund_rate:
+                        order_id, barcode = sales.pop(rng.randrange(len(sales)))
+                        self.timed(recorder, 'refund', process_refund, user, order_id,
+                                   [{'barcode': barcode, 'quantity': 1}])
+        finally:
+            connection.close() #-- each thread opened its own connection
+
+    def run_http_cashier(self, base_url, cookies, cart, refund_rate, deadline, recorder):
+        rng = random.Random()
+        session = requests.Session()
+        session.cookies.update(cookies)
+        #-- DRF's SessionAuthentication enforces csrf on writes
+        session.headers.update({'X-CSRFToken': cookies.get('csrftoken', ''), 'Referer': base_url})
+        sales = []
+
+        def call(operation, method, path, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, urljoin(base_url, path), timeout=120, **kwargs)
+                outcome = 'ok' if response.status_code < 400 else classify_failure(response.text)
+            except requests.RequestException as e:
+                response, outcome = None, classify_failure(str(e))
+            recorder.record(operation, time.perf_counter() - started, outcome)
+            return response if outcome == 'ok' else None
+
+        while time.monotonic() < deadline:
+            lines = cart(rng)
+            #-- no separate price call over HTTP, the scan response carries the price and the sale is priced server side
+            for barcode, _ in lines:
+                call('scan', 'GET', f'api/scan/{barcode}/')
+
+            response = call('purchase', 'POST', 'api/purchase/', json={
+                'payment_method': 'cash',
+                'items': [{'barcode': barcode, 'quantity': qty} for barcode, qty in lines],
+            })
+            if response is not None:
+                sales.append((response.json()['order_id'], lines[0][0]))
+
+            if sales and rng.random() < refund_rate:
+                order_id, barcode = sales.pop(rng.randrange(len(sales)))
+                call('refund', 'POST', 'api/refund/', json={
+                    'order_id': order_id, 'items': [{'barcode': barcode, 'quantity': 1}],
+                })
+
+    def sample_blocked_sessions(self, stop, samples):
+        if connection.vendor != 'postgresql':
+            return
+        try:
+            with connection.cursor() as cursor:
+                while not stop.wait(0.1):
+                    cursor.execute("SELECT count(DISTINCT pid) FROM pg_locks WHERE NOT granted")
+                    samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    def check_stock(self, barcodes, stock, user, started_at):
+        """
+        Every variant must end at reset stock - units sold + units returned by this run's orders.
+        Below zero is an oversell, any other difference is a lost update between two tills.
+        """
+        moved = {
+            row['variant_id']: row['sold'] - row['returned']
+            for row in OrderItem.objects.filter(
+                order__in=Order.objects.filter(cashier=user, created_at__gte=started_at),
+                variant__barcode__in=barcodes,
+            ).values('variant_id').annotate(sold=Sum('quantity'), returned=Sum('refunded_quantity'))
+        }
+        oversold = mismatched = 0
+        for variant_id, stock_quantity in ProductVariant.objects.filter(barcode__in=barcodes).values_list(
+                'id', 'stock_quantity'):
+            if stock_quantity < 0:
+                oversold += 1
+            if stock_quantity != stock - moved.get(variant_id, 0):
+                mismatched += 1
+        return {"oversold_variants": oversold, "mismatched_variants": mismatched,
+                "units_sold_net": sum(moved.values())}
+
+    def print_report(self, results):
+        self.stdout.write(f"{'operation':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  outcomes")
+        for operation, row in results['operations'].items():
+            outcomes = ', '.join(f"{name} {count}" for name, count in sorted(row['outcomes'].items())) or '-'
+            self.stdout.write(
+                f"{operation:<12}{row['count']:>8}{row['p50_ms'] or '-':>10}{row['p95_ms'] or '-':>10}"
+                f"{row['p99_ms'] or '-':>10}{row['max_ms'] or '-':>10}  {outcomes}"
+            )
+        if results['lock_waits'] is not None:
+            waits = results['lock_waits']
+            self.stdout.write(f"Row lock waits: {waits['count']} locks, p95 {waits['p95_ms']} ms, "
+                              f"p99 {waits['p99_ms']} ms, {waits['total_s']} s in total")
+        if results['blocked_sessions'] is not None:
+            self.stdout.write(f"Blocked sessions: max {results['blocked_sessions']['max']}, "
+                              f"avg {results['blocked_sessions']['avg']}")
+        self.stdout.write(f"Deadlocks {results['deadlocks']}, lock timeouts {results['lock_timeouts']}, "
+                          f"out of stock {results['out_of_stock']}, other errors {results['errors']}")
+        check = results['stock_check']
+        style = self.style.SUCCESS if not (check['oversold_variants'] or check['mismatched_variants']) else self.style.ERROR
+        self.stdout.write(style(f"Stock check: {check['oversold_variants']} oversold, "
+                                f"{check['mismatched_variants']} mismatched variants"))
+        purchase = results['operations']['purchase']
+        self.stdout.write(self.style.SUCCESS(
+            f"{results['sales']['per_second']} sales/s with {results['cashiers']} cashiers, "
+            f"sale p50 {purchase['p50_ms']} ms, p95 {purchase['p95_ms']} ms, p99 {purchase['p99_ms']} ms"
+        ))
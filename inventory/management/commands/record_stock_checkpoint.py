@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from inventory.services import record_stock_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Snapshots every variant\'s stock into a checkpoint for point-in-time stock queries (run nightly)'
+
+    def handle(self, *args, **options):
+        checkpoint = record_stock_checkpoint()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully recorded stock checkpoint #{checkpoint.id} ({checkpoint.items.count()} variants)'
+        ))
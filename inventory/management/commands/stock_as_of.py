@@ -0,0 +1,37 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.services import get_stock_as_of
+from inventory.utils import export_stock_as_of_csv
+
+
+class Command(BaseCommand):
+    help = 'Writes a CSV of every variant\'s stock and value at the end of a past date, e.g. for the auditors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('date', help='YYYY-MM-DD, stock is taken at the end of that day')
+        parser.add_argument('--output', help='File to write the CSV to (default: stdout)')
+
+    def handle(self, *args, **options):
+        #-- parse_date returns None for a malformed date and raises ValueError for an impossible one (2025-02-30)
+        try:
+            as_of_date = parse_date(options['date'])
+        except ValueError:
+            as_of_date = None
+        if not as_of_date:
+            raise CommandError(f"Invalid date '{options['date']}', expected a date as YYYY-MM-DD")
+
+        as_of = timezone.make_aware(datetime.combine(as_of_date + timedelta(days=1), time.min))
+        checkpoint, variants = get_stock_as_of(as_of)
+        csv_data = export_stock_as_of_csv(variants, as_of)
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                f.write(csv_data)
+            source = f"checkpoint {checkpoint.taken_at:%Y-%m-%d %H:%M}" if checkpoint else "live stock"
+            self.stdout.write(self.style.SUCCESS(f'Successfully wrote {options["output"]} (from {source})'))
+        else:
+            self.stdout.write(csv_data, ending='')
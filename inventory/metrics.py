@@ -0,0 +1,141 @@
+import threading
+import time
+from contextvars import ContextVar
+
+#-- seconds, both for the whole request and for the time spent in the database
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+#-- queries per request, anything past 50 on a read is an N+1 worth a look
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """
+    A Prometheus style cumulative histogram per label set, kept in process memory.
+    Each worker process has its own, scrape every worker (or sum them) for the whole picture.
+    """
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series = {} #-- label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.setdefault(label_values, [0] * len(self.buckets) + [0, 0])
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = _format_labels(self.label_names, label_values)
+            for upper, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{upper}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self.lock:
+            self.series[label_values] = self.series.get(label_values, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            snapshot = dict(self.series)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, label_values)}}} {value}")
+        return lines
+
+
+def _format_labels(names, values):
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+REQUEST_LATENCY = Histogram('inventro_request_duration_seconds', 'Time to produce the response, per route.',
+                            LATENCY_BUCKETS, ('route', 'method'))
+REQUEST_QUERIES = Histogram('inventro_request_db_queries', 'Database queries issued per request, per route.',
+                            QUERY_COUNT_BUCKETS, ('route', 'method'))
+REQUEST_DB_TIME = Histogram('inventro_request_db_duration_seconds', 'Time spent in the database per request, per route.',
+                            LATENCY_BUCKETS, ('route', 'method'))
+REQUESTS_TOTAL = Counter('inventro_requests_total', 'Responses by route and status code.', ('route', 'method', 'status'))
+
+METRICS = (REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, REQUESTS_TOTAL)
+
+
+#-- the QueryTimer of the request being served, a contextvar so it follows the request into the thread
+#-- that actually runs the queries (sync_to_async under ASGI) and never sees another request's queries
+_current_timer = ContextVar('inventory_query_timer', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every database connection (inventory.signals), times each query
+    into the current request's QueryTimer. Works with DEBUG off, unlike connection.queries.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.queries += 1
+        timer.seconds += time.perf_counter() - started
+
+
+class QueryTimer:
+    #-- counts the queries and DB time of everything run inside it, on every database
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.token = None
+
+    def __enter__(self):
+        self.token = _current_timer.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_timer.reset(self.token)
+
+
+def route_label(request):
+    #-- the urls.py name, so /api/scan/123/ and /api/scan/456/ are one series
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+def record_request(request, response, started, timer):
+    route = route_label(request)
+    REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method)
+    REQUEST_QUERIES.observe(timer.queries, route, request.method)
+    REQUEST_DB_TIME.observe(timer.seconds, route, request.method)
+    REQUESTS_TOTAL.inc(route, request.method, response.status_code)
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
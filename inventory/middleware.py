@@ -0,0 +1,52 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from .metrics import QueryTimer, record_request
+from .routers import REPLICA_PIN_COOKIE, replica_configured
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    Read your own writes: after a successful write, pin this browser's reads to the primary
+    for DB_REPLICA_PIN_SECONDS, long enough for the replica to catch up.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replica_configured():
+            response.set_cookie(REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and DB time of every request into the in-process histograms
+    served at /metrics/. First in MIDDLEWARE so the timing covers the whole stack.
+    Sync and async capable, so the async read views under ASGI are not pushed onto a thread for it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with QueryTimer() as timer:
+            response = self.get_response(request)
+        record_request(request, response, started, timer)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with QueryTimer() as timer:
+            response = await self.get_response(request)
+        record_request(request, response, started, timer)
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:14
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_received_quantity(apps, schema_editor):
+    #-- purchase orders received before partial receiving existed were received in full
+    PurchaseOrderItem = apps.get_model('inventory', 'PurchaseOrderItem')
+    PurchaseOrderItem.objects.filter(purchase_order__status='received').update(received_quantity=F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_notification_storesettings_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorderitem',
+            name='received_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='purchaseorder',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('ordered', 'Ordered'), ('partial', 'Partially Received'), ('received', 'Received'), ('canceled', 'Canceled')], default='draft', max_length=20),
+        ),
+        migrations.RunPython(backfill_received_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_purchaseorder_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktakesession',
+            name='category',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_stocktakecount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktakeitem',
+            name='counted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='stocktakeitem',
+            name='moved_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['variant', 'created_at'], name='log_variant_created_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_stocktakeitem_counted_at_moved_quantity_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktakeitem',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='stocktakeitem',
+            index=models.Index(fields=['session', 'version'], name='stocktake_item_version_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:22
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+#-- must stay identical to the SearchVector used by AuditLogView, or postgres will not use the index
+NOTE_SEARCH_INDEX = GinIndex(SearchVector('note', config='simple'), name='log_note_search_idx')
+
+
+def create_note_search_index(apps, schema_editor):
+    #-- full text search is postgres only, the sqlite dev db falls back to icontains
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    InventoryLog = apps.get_model('inventory', 'InventoryLog')
+    #-- concurrently, so building it on a big log table does not block sales
+    schema_editor.execute(NOTE_SEARCH_INDEX.create_sql(InventoryLog, schema_editor, concurrently=True))
+
+
+def drop_note_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    InventoryLog = apps.get_model('inventory', 'InventoryLog')
+    schema_editor.execute(NOTE_SEARCH_INDEX.remove_sql(InventoryLog, schema_editor, concurrently=True))
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """
+    -- CREATE INDEX CONCURRENTLY on postgres, so indexing a big log table does not block sales,
+    a plain CREATE INDEX on the sqlite dev db (which has no concurrent builds)
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0015_stocktakeitem_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='inventorylog',
+            index=models.Index(fields=['-created_at', '-id'], name='log_created_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='inventorylog',
+            index=models.Index(fields=['user', '-created_at'], name='log_user_created_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='inventorylog',
+            index=models.Index(fields=['action', '-created_at'], name='log_action_created_idx'),
+        ),
+        migrations.RunPython(create_note_search_index, drop_note_search_index),
+    ]
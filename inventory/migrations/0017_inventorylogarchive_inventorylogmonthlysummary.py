@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_inventorylog_audit_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryLogArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('action', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('audit', 'Audit/Correction'), ('loss', 'Damage/Theft')], max_length=20)),
+                ('quantity_change', models.IntegerField()),
+                ('stock_after', models.IntegerField()),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_logs', to='inventory.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'variant'], name='log_archive_month_idx'), models.Index(fields=['variant', 'created_at'], name='log_archive_variant_idx'), models.Index(fields=['-created_at', '-id'], name='log_archive_created_idx'), models.Index(fields=['user', '-created_at'], name='log_archive_user_idx'), models.Index(fields=['action', '-created_at'], name='log_archive_action_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryLogMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('quantity_in', models.IntegerField(default=0)),
+                ('quantity_out', models.IntegerField(default=0)),
+                ('entries', models.IntegerField(default=0)),
+                ('closing_stock', models.IntegerField()),
+                ('variant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_log_summaries', to='inventory.productvariant')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='log_summary_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('variant', 'month'), name='unique_variant_month_summary')],
+            },
+        ),
+    ]
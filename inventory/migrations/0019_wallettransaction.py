@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_opening_balances(apps, schema_editor):
+    #-- every existing non zero balance becomes the first ledger row, so balance_after always matches wallet_balance
+    Customer = apps.get_model('inventory', 'Customer')
+    WalletTransaction = apps.get_model('inventory', 'WalletTransaction')
+    WalletTransaction.objects.bulk_create(
+        (WalletTransaction(customer_id=customer_id, kind='opening', amount=balance, balance_after=balance,
+                           note="Opening balance")
+         for customer_id, balance in Customer.objects.exclude(wallet_balance=0).values_list('id', 'wallet_balance')),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_stockcheckpoint_stockcheckpointitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('debt', 'Debt Sale'), ('wallet', 'Wallet Payment'), ('deposit', 'Deposit'), ('opening', 'Opening Balance')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('note', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='wallet_transactions', to='inventory.customer')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='wallet_transactions', to='inventory.order')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer', '-created_at', '-id'], name='wallet_customer_created_idx')],
+            },
+        ),
+        migrations.RunPython(seed_opening_balances, migrations.RunPython.noop),
+    ]
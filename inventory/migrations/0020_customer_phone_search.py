@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:30
+
+import re
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+#-- must match what name__icontains compiles to on postgres (UPPER(name) LIKE UPPER('%...%')), or the index is not used
+NAME_TRIGRAM_INDEX = GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='customer_name_trgm_idx')
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    Customer = apps.get_model('inventory', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('id', 'phone').iterator(chunk_size=2000):
+        #-- same rule as models.normalize_phone, copied so the migration does not depend on current model code
+        customer.phone_normalized = re.sub(r'\D', '', customer.phone or '')
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['phone_normalized'])
+            batch = []
+    Customer.objects.bulk_update(batch, ['phone_normalized'])
+
+
+def create_name_trigram_index(apps, schema_editor):
+    #-- trigram search is postgres only, the sqlite dev db just scans
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Customer = apps.get_model('inventory', 'Customer')
+    #-- concurrently, so building it on a big customer table does not block the tills
+    schema_editor.execute(NAME_TRIGRAM_INDEX.create_sql(Customer, schema_editor, concurrently=True))
+
+
+def drop_name_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Customer = apps.get_model('inventory', 'Customer')
+    schema_editor.execute(NAME_TRIGRAM_INDEX.remove_sql(Customer, schema_editor, concurrently=True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0019_wallettransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['-created_at'], name='customer_created_idx'),
+        ),
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+        #-- no-op on sqlite
+        TrigramExtension(),
+        migrations.RunPython(create_name_trigram_index, drop_name_trigram_index),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_totals(apps, schema_editor):
+    #-- one UPDATE with correlated subqueries, from here on process_purchase / process_refund keep them current
+    Customer = apps.get_model('inventory', 'Customer')
+    Order = apps.get_model('inventory', 'Order')
+    OrderItem = apps.get_model('inventory', 'OrderItem')
+    money = DecimalField(max_digits=14, decimal_places=2)
+
+    orders = Order.objects.filter(customer=OuterRef('pk')).exclude(status='quote').values('customer')
+    refunds = OrderItem.objects.filter(order__customer=OuterRef('pk')).exclude(order__status='quote').values(
+        'order__customer').annotate(
+        total=Sum(ExpressionWrapper(F('refunded_quantity') * F('unit_price'), output_field=money))
+    ).values('total')
+
+    Customer.objects.update(
+        lifetime_value=(
+            Coalesce(Subquery(orders.annotate(total=Sum('total_amount')).values('total')), Value(Decimal('0')),
+                     output_field=money)
+            - Coalesce(Subquery(refunds), Value(Decimal('0')), output_field=money)
+        ),
+        order_count=Coalesce(Subquery(orders.annotate(n=Count('id')).values('n')), 0),
+        last_visit_at=Subquery(orders.annotate(last=Max('created_at')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_customer_phone_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='debt_0_30',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debt_31_60',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debt_aged_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debt_over_60',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_visit_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['wallet_balance'], name='customer_wallet_balance_idx'),
+        ),
+        migrations.RunPython(backfill_customer_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:10
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_session_versions(apps, schema_editor):
+    #-- carry on from the highest item version (a count id until now), so devices mid-session keep syncing
+    StocktakeSession = apps.get_model('inventory', 'StocktakeSession')
+    StocktakeItem = apps.get_model('inventory', 'StocktakeItem')
+    latest = StocktakeItem.objects.filter(session=OuterRef('pk')).values('session').annotate(
+        latest=Max('version')).values('latest')
+    StocktakeSession.objects.update(version=Coalesce(Subquery(latest), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_customer_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktakesession',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_session_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:40
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+#-- must match what icontains compiles to on postgres (UPPER(col) LIKE UPPER('%...%')), or the indexes are not used
+TRIGRAM_INDEXES = [
+    ('Product', GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_trgm_idx')),
+    ('ProductVariant', GinIndex(OpClass(Upper('sku'), name='gin_trgm_ops'), name='variant_sku_trgm_idx')),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    #-- trigram search is postgres only, the sqlite dev db just scans
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in TRIGRAM_INDEXES:
+        model = apps.get_model('inventory', model_name)
+        schema_editor.execute(index.create_sql(model, schema_editor, concurrently=True))
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in TRIGRAM_INDEXES:
+        model = apps.get_model('inventory', model_name)
+        schema_editor.execute(index.remove_sql(model, schema_editor, concurrently=True))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('inventory', '0022_stocktakesession_version'),
+    ]
+
+    operations = [
+        #-- already there since 0020, no-op then
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,5 +1,11 @@
+import re
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
+from django.db.models import F, Sum
+from django.utils import timezone
 
 
 # Create your models here.
@@ -36,20 +42,53 @@ class ProductVariant(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.name_suffix}"
     
+def normalize_phone(phone):
+    #-- digits only, so "0803 123-4567" and "08031234567" index and search the same
+    return re.sub(r'\D', '', phone or '')
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=20, unique=True) # Primary identifier
+    #-- what the till searches on, always derived from phone in save()
+    phone_normalized = models.CharField(max_length=20, db_index=True, editable=False, default='')
     email = models.EmailField(blank=True, null=True)
     address = models.TextField(blank=True)
     
     # Positive = They have money with us (Store Credit)
     # Negative = They owe us money (Debt)
     wallet_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    #-- running totals, bumped with F() by process_purchase / process_refund so no one has to sum the orders
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0) # net of refunds
+    order_count = models.PositiveIntegerField(default=0)
+    last_visit_at = models.DateTimeField(null=True, blank=True)
+
+    #-- outstanding debt by age, the buckets move with time so the nightly age_customer_debt job recomputes them
+    debt_0_30 = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    debt_31_60 = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    debt_over_60 = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    debt_aged_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        #-- the trigram index on name is postgres only, see migration 0020
+        indexes = [
+            models.Index(fields=['-created_at'], name='customer_created_idx'),
+            #-- the debtors list filters on wallet_balance < 0
+            models.Index(fields=['wallet_balance'], name='customer_wallet_balance_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.phone})"
+
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_normalized'}
+        super().save(*args, **kwargs)
     
 #_------------- Transactions 
 
@@ -100,6 +139,41 @@ class OrderItem(models.Model):
     
     def __str__(self):
         return f"{self.quantity} - {self.variant.sku}"
+
+
+class WalletTransaction(models.Model):
+    """
+    -- Append only ledger of every change to a customer's wallet_balance.
+    Customer.wallet_balance stays as the running total, each row snapshots the balance after it,
+    so a statement only needs the row just before its start date, never the full history.
+    """
+    KIND_CHOICES = [
+        ('debt', 'Debt Sale'),          # Pay later, balance goes down
+        ('wallet', 'Wallet Payment'),   # Paid from store credit, balance goes down
+        ('deposit', 'Deposit'),         # Customer pays in (top up / debt repayment), balance goes up
+        ('opening', 'Opening Balance'), # Balance carried over when the ledger was introduced
+    ]
+
+    customer = models.ForeignKey(Customer, related_name='wallet_transactions', on_delete=models.PROTECT)
+    order = models.ForeignKey(Order, related_name='wallet_transactions', on_delete=models.SET_NULL, null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2) # signed, e.g -5000 for a debt sale
+
+    #-- snapshot of the wallet balance after this entry
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            #-- customer statements seek on (customer, created_at)
+            models.Index(fields=['customer', '-created_at', '-id'], name='wallet_customer_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.name} {self.kind} {self.amount}"
     
 
 class InventoryLog(models.Model):
@@ -124,6 +198,92 @@ class InventoryLog(models.Model):
     note = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        #-- the audit screen seeks on (created_at, id), the structured filters each have their own index
+        #-- the full text index on note is postgres only, see migration 0016
+        indexes = [
+            #-- movements of a variant over a time window (stocktake reconciliation, audit by product)
+            models.Index(fields=['variant', 'created_at'], name='log_variant_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='log_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='log_user_created_idx'),
+            models.Index(fields=['action', '-created_at'], name='log_action_created_idx'),
+        ]
+
+
+
+class InventoryLogArchive(models.Model):
+    """
+    -- InventoryLog rows older than the retention horizon (settings.INVENTORY_LOG_RETENTION_DAYS)
+    moved here month by month by the archive_inventory_logs command, so the hot table stays small.
+    same ids and columns as InventoryLog, plus the month the row belongs to
+    """
+    id = models.BigIntegerField(primary_key=True) #-- kept from InventoryLog so (created_at, id) ordering carries on
+    month = models.DateField() #-- first day of the month
+
+    variant = models.ForeignKey(ProductVariant, related_name='archived_logs', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    action = models.CharField(max_length=20, choices=InventoryLog.ACTION_CHOICES)
+    quantity_change = models.IntegerField()
+    stock_after = models.IntegerField()
+    note = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['month', 'variant'], name='log_archive_month_idx'),
+            models.Index(fields=['variant', 'created_at'], name='log_archive_variant_idx'),
+            models.Index(fields=['-created_at', '-id'], name='log_archive_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='log_archive_user_idx'),
+            models.Index(fields=['action', '-created_at'], name='log_archive_action_idx'),
+        ]
+
+
+class InventoryLogMonthlySummary(models.Model):
+    """
+    -- one row per variant per archived month, so reports over old periods never touch the raw rows
+    """
+    variant = models.ForeignKey(ProductVariant, related_name='monthly_log_summaries', on_delete=models.CASCADE)
+    month = models.DateField() #-- first day of the month
+
+    quantity_in = models.IntegerField(default=0) #-- sum of the positive changes (restocks, returns, count gains)
+    quantity_out = models.IntegerField(default=0) #-- sum of the negative changes (sales, losses), stored negative
+    entries = models.IntegerField(default=0) #-- how many log rows the month had
+    closing_stock = models.IntegerField() #-- stock_after of the last row of the month
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['variant', 'month'], name='unique_variant_month_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='log_summary_month_idx'),
+        ]
+
+    def net_change(self):
+        return self.quantity_in + self.quantity_out
+
+
+class StockCheckpoint(models.Model):
+    """
+    -- a nightly snapshot of every variant's stock (record_stock_checkpoint command).
+    stock on any past date = nearest checkpoint before it + the InventoryLog deltas since, see get_stock_as_of()
+    """
+    taken_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Stock Checkpoint {self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class StockCheckpointItem(models.Model):
+    checkpoint = models.ForeignKey(StockCheckpoint, related_name='items', on_delete=models.CASCADE)
+    variant = models.ForeignKey(ProductVariant, related_name='stock_checkpoints', on_delete=models.CASCADE)
+    stock_quantity = models.IntegerField()
+    #-- cost at the time, so historical valuation uses the cost of that day and not today's
+    cost_price = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['checkpoint', 'variant'], name='unique_checkpoint_variant'),
+        ]
 
 
 class Promotion(models.Model):
@@ -160,6 +320,7 @@ class PurchaseOrder(models.Model):
     STATUS_CHOICES =[
         ('draft', 'Draft'), #--planning to order
         ('ordered', 'Ordered'), #-- order sent to supplier
+        ('partial', 'Partially Received'), #-- some cartons scanned in, more outstanding
         ('received', 'Received'), #--order arrived
         ('canceled', 'Canceled')
     ]
@@ -177,8 +338,23 @@ class PurchaseOrder(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        #-- backs the procurement list filters, newest first
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='po_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='po_status_created_idx'),
+            models.Index(fields=['supplier', '-created_at'], name='po_supplier_created_idx'),
+        ]
+
     def __str__(self):
         return f"Purchase Order #{self.id} - {self.supplier.name}"
+
+    def outstanding_quantity(self):
+        #-- units ordered but not scanned in yet, summed in the db
+        outstanding = self.items.aggregate(
+            total=Sum(F('quantity') - F('received_quantity'))
+        )['total']
+        return outstanding or 0
     
 
     
@@ -186,11 +362,16 @@ class PurchaseOrderItem(models.Model):
     purchase_order = models.ForeignKey(PurchaseOrder, related_name='items', on_delete=models.CASCADE)
     variant = models.ForeignKey(ProductVariant, related_name='purchase_order_items', on_delete=models.PROTECT)
     quantity = models.IntegerField()
+    #-- how many units have been scanned in at the dock so far, bumped with F() on every scan batch
+    received_quantity = models.IntegerField(default=0)
     #--cost price per item for this specific shipment
     unit_cost = models.DecimalField(max_digits=12, decimal_places=2)
 
     def get_total(self):
         return self.quantity * self.unit_cost
+
+    def outstanding_quantity(self):
+        return self.quantity - self.received_quantity
     
 class StocktakeSession(models.Model):
     STATUS_CHOICES = [('in_progress', 'In Progress'), ('completed', 'Completed'), ('canceled', 'Canceled')]
@@ -198,9 +379,15 @@ class StocktakeSession(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
     note = models.CharField(max_length=255, blank=True)
+    #-- optional scope, only variants in this product category are counted. blank means the whole store
+    category = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Last change number handed out to this session's items. Bumped while holding the session row lock,
+    # so numbers follow commit order and a device polling ?since= cannot skip a change that commits late
+    version = models.BigIntegerField(default=0)
+
     def __str__(self):
         return f"Stocktake #{self.id} ({self.status})"
 
@@ -213,9 +400,41 @@ class StocktakeItem(models.Model):
     
     # Actual: What the human counted
     counted_quantity = models.IntegerField(default=0)
+    counted_at = models.DateTimeField(null=True, blank=True) #-- last time anyone counted this item
+
+    # Sales, receipts, refunds... logged between the snapshot and the count, filled in at approval
+    # so we can count during trading hours
+    moved_quantity = models.IntegerField(default=0)
+
+    # Change number for the delta feed: the session version of the last change to this item, 0 = never counted
+    # handhelds ask for "changes since version N" instead of downloading the whole session
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'version'], name='stocktake_item_version_idx'),
+        ]
     
     def variance(self):
-        return self.counted_quantity - self.expected_quantity
+        return self.counted_quantity - (self.expected_quantity + self.moved_quantity)
+
+class StocktakeCount(models.Model):
+    """
+    -- one row per count entry, per counter and per zone (aisle, shelf, back room ...)
+    entries are only ever inserted, and the item's counted_quantity is bumped with F(),
+    so many staff can count the same SKU in different aisles without overwriting each other
+    """
+    session = models.ForeignKey(StocktakeSession, related_name='counts', on_delete=models.CASCADE)
+    item = models.ForeignKey(StocktakeItem, related_name='counts', on_delete=models.CASCADE)
+    counted_by = models.ForeignKey(User, on_delete=models.PROTECT)
+    zone = models.CharField(max_length=50, blank=True)
+
+    #-- what this entry adds to the count, negative when a counter corrects their own count down
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item_id} by {self.counted_by_id} ({self.zone or 'no zone'})"
 
 class StoreSettings(models.Model):
     store_name = models.CharField(max_length=255, default="My Store")
@@ -226,6 +445,21 @@ class StoreSettings(models.Model):
     def __str__(self):
         return  self.store_name
 
+    CACHE_KEY = 'inventory:store_settings'
+
+    @classmethod
+    def load(cls):
+        """
+        The settings singleton, read through the cache (per process with the default local memory cache).
+        Every receipt needs it and it changes about once a year, so this is normally zero queries.
+        inventory.signals clears the cached copy whenever the row is saved or deleted.
+        """
+        store_settings = cache.get(cls.CACHE_KEY)
+        if store_settings is None:
+            store_settings, _ = cls.objects.get_or_create(id=1)
+            cache.set(cls.CACHE_KEY, store_settings, settings.STORE_SETTINGS_CACHE_SECONDS)
+        return store_settings
+
     def save(self, *args, **kwargs):
         """
         We ensure oly one settings objects exists
@@ -0,0 +1,38 @@
+from rest_framework.pagination import CursorPagination
+
+
+#-- cursor pagination seeks on an indexed column instead of OFFSET + COUNT(*), so page 500 costs the same as page 1
+class InventoryLogCursorPagination(CursorPagination):
+    page_size = 20 #-- backend chunks
+    ordering = ('-created_at', '-id')
+
+
+class PurchaseOrderCursorPagination(CursorPagination):
+    page_size = 50
+    ordering = ('-created_at', '-id')
+
+
+class PurchaseOrderItemCursorPagination(CursorPagination):
+    page_size = 100
+    ordering = 'id'
+
+
+class StocktakeItemCursorPagination(CursorPagination):
+    page_size = 200
+    ordering = 'id'
+
+
+class StockAsOfCursorPagination(CursorPagination):
+    page_size = 200
+    ordering = 'id'
+
+
+class WalletTransactionCursorPagination(CursorPagination):
+    page_size = 50
+    ordering = ('-created_at', '-id')
+
+
+#-- DebtorListView swaps the first ordering field for the column the user sorts on
+class DebtorCursorPagination(CursorPagination):
+    page_size = 100
+    ordering = ('wallet_balance', 'id')
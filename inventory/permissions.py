@@ -1,10 +1,36 @@
 from rest_framework import permissions
 
+#-- attribute the user's group names are memoized on, request.user is one object per request
+#-- so this is a per request cache, inventory.signals drops it when the user's groups change
+GROUP_NAMES_ATTR = '_inventory_group_names'
+
+
+def get_group_names(user):
+    """
+    The user's group names in id order, resolved at most once per user object.
+    Uses prefetch_related('groups') when the queryset has it, so listing staff costs no extra queries.
+    """
+    names = getattr(user, GROUP_NAMES_ATTR, None)
+    if names is None:
+        names = [group.name for group in sorted(user.groups.all(), key=lambda group: group.id)]
+        setattr(user, GROUP_NAMES_ATTR, names)
+    return names
+
+
+def is_manager(user):
+    return user.is_superuser or 'Manager' in get_group_names(user)
+
+
+def get_role(user):
+    if user.is_superuser:
+        return "Owner"
+    names = get_group_names(user)
+    return names[0] if names else "Staff"
+
+
 class IsManager(permissions.BasePermission):
     """
     Allows access to users in the Manager group or super users
     """
     def has_permission(self, request, view):
-        if request.user.is_superuser:
-            return True
-        return request.user.groups.filter(name='Manager').exists()
\ No newline at end of file
+        return is_manager(request.user)
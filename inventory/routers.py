@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA_ALIAS = 'replica'
+
+#-- set by read_from_replica while a report / export / list view runs, a contextvar so it follows the request
+#-- through threads (sync views under ASGI) without leaking into other requests
+_use_replica = ContextVar('inventory_use_replica', default=False)
+
+#-- set on the response after a successful write, while it lives this browser's reads stay on the primary
+REPLICA_PIN_COOKIE = 'db_pin'
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def get_read_alias():
+    #-- for code that names a database itself (dumpdata) instead of going through the router
+    return REPLICA_ALIAS if _use_replica.get() and replica_configured() else 'default'
+
+
+def read_from_replica(view_func):
+    """
+    Sends the view's inventory reads to the read replica, if one is configured.
+    Only GET/HEAD are routed, and not for a browser that wrote something in the last DB_REPLICA_PIN_SECONDS
+    (see ReplicaPinMiddleware), so the order a cashier just rang up is always in their own sales list.
+    Use with method_decorator(read_from_replica, name='dispatch') on APIViews.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or request.COOKIES.get(REPLICA_PIN_COOKIE):
+            return view_func(request, *args, **kwargs)
+        with use_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    """
+    Inventory reads inside read_from_replica go to the replica, everything else stays on the primary.
+    Auth and session tables are never routed, a session created a moment ago may not have replicated yet.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'inventory' and _use_replica.get() and replica_configured():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        #-- explicit, otherwise django would write an instance back to the database it was read from
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True #-- same data on both sides
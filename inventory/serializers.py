@@ -1,10 +1,13 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User, Group
 from rest_framework import serializers
 
 from .models import (ProductVariant, Order, Supplier, PurchaseOrder,
-                     PurchaseOrderItem, OrderItem, InventoryLog, Customer,
-                     StocktakeItem, StocktakeSession, StoreSettings, Notification
+                     PurchaseOrderItem, OrderItem, InventoryLog, InventoryLogArchive, Customer,
+                     StocktakeItem, StocktakeSession, StoreSettings, Notification, WalletTransaction
                      )
+from .permissions import get_role
 
 
 #-- just like dto + mappers in Java, Ahh, I miss Java
@@ -22,6 +25,17 @@ class ProductVariantSerializer(serializers.ModelSerializer):
             'name_suffix', 'price', 'stock_quantity'
         ]
 
+#-- a variant's stock on a past date, expects the annotations from get_stock_as_of()
+class StockAsOfSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    stock_quantity = serializers.IntegerField(source='stock_as_of', read_only=True)
+    cost_price = serializers.DecimalField(source='cost_as_of', max_digits=20, decimal_places=2, read_only=True)
+    value = serializers.DecimalField(source='value_as_of', max_digits=20, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = ProductVariant
+        fields = ['id', 'sku', 'product_name', 'name_suffix', 'stock_quantity', 'cost_price', 'value']
+
 class PurchaseItemSerializer(serializers.Serializer):
     #--validates single item in cart
     barcode = serializers.CharField()
@@ -60,22 +74,38 @@ class PurchaseOrderItemSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = PurchaseOrderItem
-        fields = ['id', 'variant', 'barcode', 'product_name', 'quantity', 'unit_cost']
+        fields = ['id', 'variant', 'barcode', 'product_name', 'quantity', 'received_quantity', 'unit_cost']
 
+#-- summary only, the lines come from their own endpoint (PurchaseOrderItemSerializer)
+#-- line_count and outstanding_quantity are annotated on the queryset, so no per-row queries
 class PurchaseOrderSerializer(serializers.ModelSerializer):
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
-    items = PurchaseOrderItemSerializer(many=True, read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+    outstanding_quantity = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = PurchaseOrder
-        fields = ['id', 'supplier', 'supplier_name', 'status', 'total_cost', 'created_at', 'items']
+        fields = ['id', 'supplier', 'supplier_name', 'status', 'total_cost', 'expected_date', 'received_date',
+                  'created_at', 'line_count', 'outstanding_quantity']
 
 #-- Input Serializer for creating a Purchase Order
+class CreatePurchaseOrderItemSerializer(serializers.Serializer):
+    #--expects: {'variant_id': 1, 'quantity': 10, 'cost': 50.00}
+    variant_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    cost = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
+
 class CreatePurchaseOrderSerializer(serializers.Serializer):
     supplier_id = serializers.IntegerField()
-    items = serializers.ListField(
-        child=serializers.DictField() #--expects: {'variant_id': 1, 'quantity': 10, 'cost': 50.00}
-    )
+    items = CreatePurchaseOrderItemSerializer(many=True, allow_empty=False)
+
+#-- Input Serializer for scanning cartons in at the receiving dock
+class ReceiveScanItemSerializer(serializers.Serializer):
+    barcode = serializers.CharField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class ReceiveScanSerializer(serializers.Serializer):
+    items = ReceiveScanItemSerializer(many=True, allow_empty=False)
 
 class RefundItemSerializer(serializers.Serializer):
     barcode = serializers.CharField()
@@ -113,6 +143,11 @@ class InventoryLogSerializer(serializers.ModelSerializer):
         model = InventoryLog
         fields = ['id', 'action', 'quantity_change', 'stock_after', 'note', 'created_at', 'product_name', 'sku', 'user_name']
 
+#-- same shape as a live log, so the audit screen does not care which table a row came from
+class InventoryLogArchiveSerializer(InventoryLogSerializer):
+    class Meta(InventoryLogSerializer.Meta):
+        model = InventoryLogArchive
+
 
 class UserSerializer(serializers.ModelSerializer):
     role = serializers.SerializerMethodField()
@@ -121,8 +156,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'is_active', 'date_joined', 'role']
 
     def get_role(self, obj):
-        if obj.is_superuser: return "Owner"
-        return obj.groups.first().name if obj.groups.exists() else "Staff"
+        return get_role(obj)
     
 class CreateUserSerializer(serializers.ModelSerializer):
     #-- we are handling role manually because it is not a field on User model, it's a relationship
@@ -146,18 +180,49 @@ class CreateUserSerializer(serializers.ModelSerializer):
         return user
     
 class CustomerSerializer(serializers.ModelSerializer):
+    outstanding_debt = serializers.SerializerMethodField()
+
     class Meta:
         model = Customer
         fields = '__all__'
+        #-- wallet_balance only moves through the wallet ledger, the rest are maintained aggregates
+        read_only_fields = ['wallet_balance', 'lifetime_value', 'order_count', 'last_visit_at',
+                            'debt_0_30', 'debt_31_60', 'debt_over_60', 'debt_aged_at']
+
+    def get_outstanding_debt(self, obj):
+        #-- same string format as the DecimalFields
+        return str(-obj.wallet_balance if obj.wallet_balance < 0 else Decimal('0.00'))
+
+class WalletTransactionSerializer(serializers.ModelSerializer):
+    user_name = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = WalletTransaction
+        fields = ['id', 'kind', 'amount', 'balance_after', 'order', 'note', 'created_at', 'user_name']
+
+class WalletDepositSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    note = serializers.CharField(required=False, default="", allow_blank=True, max_length=255)
 
 class StocktakeItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='variant.product.name', read_only=True)
     sku = serializers.CharField(source='variant.sku', read_only=True)
     barcode = serializers.CharField(source='variant.barcode', read_only=True)
+    my_count = serializers.IntegerField(read_only=True, default=0) #-- the requesting counter's own count, see with_own_counts
 
     class Meta:
         model = StocktakeItem
-        fields = ['id', 'variant', 'product_name', 'sku', 'barcode', 'expected_quantity', 'counted_quantity']
+        fields = ['id', 'variant', 'product_name', 'sku', 'barcode', 'expected_quantity', 'counted_quantity',
+                  'my_count', 'counted_at', 'moved_quantity', 'version']
+
+#-- Input Serializer for handheld scanner batches, a raw scan without quantity counts as 1
+class StocktakeScanSerializer(serializers.Serializer):
+    barcode = serializers.CharField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+class StocktakeScanBatchSerializer(serializers.Serializer):
+    zone = serializers.CharField(max_length=50, required=False, allow_blank=True, default='') #-- aisle/shelf being counted
+    scans = StocktakeScanSerializer(many=True, allow_empty=False)
 
 class StocktakeSessionSerializer(serializers.ModelSerializer):
     items = StocktakeItemSerializer(many=True, read_only=True)
@@ -165,7 +230,7 @@ class StocktakeSessionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = StocktakeSession
-        fields = ['id', 'status', 'note', 'created_at', 'completed_at', 'created_by_name', 'items']
+        fields = ['id', 'status', 'note', 'category', 'created_at', 'completed_at', 'created_by_name', 'items']
 
 class StoreSettingsSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,7 +1,11 @@
+from datetime import timedelta
 from decimal import Decimal
 
-from django.db import transaction
-from django.db.models import F, Sum
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q,
+                              Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Greatest, Now
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
@@ -9,11 +13,17 @@ from .models import Notification
 from .models import (Order, OrderItem,
                      InventoryLog, PurchaseOrder, PurchaseOrderItem,
                      Supplier, Product, ProductVariant, Customer,
-                     StocktakeSession, StocktakeItem
+                     StocktakeSession, StocktakeItem, StocktakeCount,
+                     InventoryLogArchive, InventoryLogMonthlySummary,
+                     StockCheckpoint, StockCheckpointItem, WalletTransaction
                      )
+from .log_writer import InventoryLogWriter
 from .pricing import calculate_dynamic_price
 from .utils import generate_barcode_pdf
 
+#-- rows moved per transaction when archiving old inventory logs
+LOG_ARCHIVE_BATCH_SIZE = 5000
+
 
 #-- felt like home a litle bit, but this is actually a weird way of defining types (only for readbility, nah nah, it doesn't even use it)
 def get_product_by_barcode(barcode: str) -> ProductVariant: #-- retunrs ProductVariant
@@ -29,7 +39,7 @@ def process_purchase(user, payment_method, items_data, customer_id=None, is_quot
     """
     Handles Sales, including Debt and Wallet payments.
     """
-    with transaction.atomic():
+    with transaction.atomic(), InventoryLogWriter() as logs:
         customer = None
         if customer_id:
             try:
@@ -78,7 +88,7 @@ def process_purchase(user, payment_method, items_data, customer_id=None, is_quot
                 variant.stock_quantity -= qty
                 variant.save()
 
-                InventoryLog.objects.create(
+                logs.add(
                     variant=variant, user=user, action='sale', quantity_change=-qty,
                     stock_after=variant.stock_quantity, note=f"Order #{order.id}"
                 )
@@ -103,17 +113,24 @@ def process_purchase(user, payment_method, items_data, customer_id=None, is_quot
         order.total_amount = total_sum
         order.save()
 
+        #-- customer running totals, F() so two tills serving the same customer cannot overwrite each other
+        if customer and not is_quote:
+            Customer.objects.filter(id=customer.id).update(
+                lifetime_value=F('lifetime_value') + total_sum,
+                order_count=F('order_count') + 1,
+                last_visit_at=order.created_at
+            )
+
         #-- we handle Debt/Pay from wallet only for Real Sales
         if not is_quote:
             if payment_method == 'debt':
                 if not customer: raise ValidationError("Customer required for Debt")
-                customer.wallet_balance -= total_sum
-                customer.save()
+                post_wallet_transaction(customer.id, -total_sum, 'debt', user=user, order=order,
+                                        note=f"Order #{order.id}")
             elif payment_method=='wallet':
                 if not customer: raise ValidationError("Customer required")
-                if customer.wallet_balance < total_sum: raise ValidationError("Insufficient wallet funds")
-                customer.wallet_balance -= total_sum
-                customer.save()
+                post_wallet_transaction(customer.id, -total_sum, 'wallet', user=user, order=order,
+                                        note=f"Order #{order.id}", require_funds=True)
         return order
 
         # # -- HANDLE DEBT/WALLET LOGIC
@@ -140,7 +157,7 @@ def adjust_inventory(user, data):
     """
     This handles restocking, damages and manual corrections
     """
-    with transaction.atomic():
+    with transaction.atomic(), InventoryLogWriter() as logs:
         barcode = data['barcode']
         qty_change = data['quantity_change']
         action = data['action']
@@ -162,7 +179,7 @@ def adjust_inventory(user, data):
         variant.save()
 
         #--we write to inventory log also
-        InventoryLog.objects.create(
+        logs.add(
             variant = variant,
             user = user,
             action = action,
@@ -235,10 +252,8 @@ def get_top_selling_items():
 def receive_purchase_order(user, purchase_order_id):
     """
     -- this finalizes a purchase order
-    1.locks the db, in case of concurrent update, pessimistic locking
-    2. updates stocks for all  items
-    3. updates the product cost prices as it may have changed
-    4. we log the changes
+    receives everything that is still outstanding in one go, for when the whole delivery is checked at once.
+    the actual stock posting is done by receive_purchase_order_items()
     """
 
     with transaction.atomic():
@@ -250,115 +265,189 @@ def receive_purchase_order(user, purchase_order_id):
         
         if purchase_order.status == 'received':
             raise ValidationError("This purchase order has beeen reieved already")
-        
-        all_items = purchase_order.items.all()
-        
-        for item in all_items:
-            variant = item.variant
 
-            #-- locking the row for update
-            variant = ProductVariant.objects.select_for_update().get(id=variant.id)
+        #-- whatever has not been scanned in yet is what we receive now
+        outstanding_items = [
+            {'barcode': item.variant.barcode, 'quantity': item.quantity - item.received_quantity}
+            for item in purchase_order.items.select_related('variant')
+            if item.quantity > item.received_quantity
+        ]
 
-            # old_stock = variant.stock_quantity
-            # new_stock = old_stock + item.quantity
+        return receive_purchase_order_items(user, purchase_order.id, outstanding_items)
 
-            current_stock = Decimal(variant.stock_quantity)
-            current_cost = variant.cost_price
-            incoming_qty = Decimal(item.quantity)
-            incoming_cost = item.unit_cost
 
-            if current_stock <= 0:
-                new_cost = incoming_cost
-            else:
-                # 2. Calculate AVCO(Average Cost)
-                # Formula: ((OldQty * OldCost) + (NewQty * NewCost)) / (OldQty + NewQty)
-                total_value = (current_stock * current_cost) + (incoming_qty * incoming_cost)
-                total_qty = current_stock + incoming_qty
-                new_cost = total_value / total_qty
+def receive_purchase_order_items(user, purchase_order_id, scanned_items):
+    """
+    -- posts a batch of scanned cartons against a purchase order (incremental receiving)
+    1. locks the purchase order row so two scanners cannot over-receive the same line
+    2. bumps received_quantity on the matching lines, written back with one bulk update
+    3. locks the affected variants in one query, adds the stock and updates the cost price
+    4. we log the changes, and mark the purchase order partial/received
+
+    every call is its own short transaction, so stock is sellable as soon as the batch commits.
+    scanned_items: [{'barcode': '123', 'quantity': 12}, ...]
+    """
+
+    with transaction.atomic(), InventoryLogWriter() as logs:
+        try:
+            purchase_order = PurchaseOrder.objects.select_for_update().get(id = purchase_order_id)
+        except PurchaseOrder.DoesNotExist:
+            raise ValidationError("Purchase Order Not Found")
+
+        if purchase_order.status in ('received', 'canceled'):
+            raise ValidationError(f"This purchase order is already {purchase_order.status}")
 
-            #-- stock update
-            variant.stock_quantity = int(current_stock + incoming_qty)
+        #-- the same carton barcode can be scanned many times in one batch, we add them up
+        scanned = {}
+        for item in scanned_items:
+            scanned[item['barcode']] = scanned.get(item['barcode'], 0) + item['quantity']
 
-            #-- update the CP
-            variant.cost_price = item.unit_cost
+        #-- one query for all the lines touched by this batch
+        lines_by_barcode = {}
+        lines = purchase_order.items.select_related('variant').filter(variant__barcode__in=scanned.keys()).order_by('id')
+        for line in lines:
+            lines_by_barcode.setdefault(line.variant.barcode, []).append(line)
 
-            variant.save()
+        missing = [barcode for barcode in scanned if barcode not in lines_by_barcode]
+        if missing:
+            raise ValidationError(f"Items not on this purchase order: {', '.join(missing)}")
+
+        #-- split each scanned quantity over the lines that still have something outstanding
+        allocations = [] #-- (line, qty)
+        for barcode, qty in scanned.items():
+            remaining = qty
+            for line in lines_by_barcode[barcode]:
+                take = min(remaining, line.outstanding_quantity())
+                if take > 0:
+                    #-- safe without F(), the purchase order lock keeps other receipts off these lines
+                    line.received_quantity += take
+                    allocations.append((line, take))
+                    remaining -= take
+            if remaining > 0:
+                outstanding = qty - remaining
+                raise ValidationError(f"Cannot receive {qty} of {barcode}. Only {outstanding} outstanding.")
+
+        #-- lock all the affected variants together, in id order so concurrent receipts/sales cannot deadlock
+        variants = ProductVariant.objects.select_for_update().order_by('id').in_bulk(
+            {line.variant_id for line, _ in allocations}
+        )
+
+        PurchaseOrderItem.objects.bulk_update([line for line, _ in allocations], ['received_quantity'])
+
+        for line, qty in allocations:
+            variant = variants[line.variant_id]
+            variant.stock_quantity += qty
+            #-- update the CP to this shipment's cost
+            variant.cost_price = line.unit_cost
 
             #-- inventory log (audit)
-            InventoryLog.objects.create(
+            logs.add(
                 variant=variant,
                 user=user,
                 action='restock',
-                quantity_change=item.quantity,
+                quantity_change=qty,
                 stock_after=variant.stock_quantity,
                 note=f"PO #{purchase_order.id} (Average Cost: {variant.cost_price})"
             )
-        
-        #-- we mark the purchase order as received
-        purchase_order.status = 'received'
-        purchase_order.received_date = timezone.now()
-        purchase_order.save()
 
-        Notification.objects.create(
-            title="Stock Received",
-            message=f"Purchase Order #{purchase_order.id} from {purchase_order.supplier.name} has been added to inventory.",
-            link="procurement"
-        )
+        ProductVariant.objects.bulk_update(variants.values(), ['stock_quantity', 'cost_price'])
+
+        #-- we mark the purchase order as received once nothing is outstanding
+        if purchase_order.outstanding_quantity() == 0:
+            purchase_order.status = 'received'
+            purchase_order.received_date = timezone.now()
+            purchase_order.save()
+
+            Notification.objects.create(
+                title="Stock Received",
+                message=f"Purchase Order #{purchase_order.id} from {purchase_order.supplier.name} has been added to inventory.",
+                link="procurement"
+            )
+        else:
+            purchase_order.status = 'partial'
+            purchase_order.save()
 
         return purchase_order
     
 
 def process_refund(user, order_id, refund_items):
-    with transaction.atomic():
+    """
+    -- returns items from an order
+    1. locks the order so two refunds on the same order cannot both pass the returnable check
+    2. loads all the order's lines in one query, keyed by barcode
+    3. locks the affected variants together and applies everything with bulk writes
+    so a 30 item return costs the same number of queries as a 1 item return
+    """
+    with transaction.atomic(), InventoryLogWriter() as logs:
         try:
-            order = Order.objects.get(id=order_id) #-- we get the order
-        except:
+            order = Order.objects.select_for_update().get(id=order_id) #-- we get the order
+        except Order.DoesNotExist:
             raise ValidationError("Order Not Found")
 
+        lines_by_barcode = {}
+        for order_item in order.items.select_related('variant').order_by('id'):
+            lines_by_barcode.setdefault(order_item.variant.barcode, []).append(order_item)
+
         total_refund = 0
+        touched_lines = {} #-- order item id -> order item, for the bulk update
+        returns = [] #-- (variant_id, qty, is_damaged)
 
         for item in refund_items:
             barcode=item['barcode'] #-- must be provided, that is hwy we access the element like that, KeyError is thrown if not provided
             qty= item['quantity'] #-- same , 'this is the qty the user is trying to return right now'
             is_damaged= item.get('is_damaged', False) #-- optional, that is why we use get(), if key exists, return the value, if not, return False
 
-            try:
-                #-- We filter by order=order AND barcode to find the specific item in this order
-                order_item = OrderItem.objects.get(order=order, variant__barcode=barcode)
-            except OrderItem.DoesNotExist:
+            lines = lines_by_barcode.get(barcode)
+            if not lines:
                 raise ValidationError(f"Item {barcode} not in this order.")
-            except OrderItem.MultipleObjectsReturned:
-                #--If duplicate items exist in one order, assume the first one
-                order_item = OrderItem.objects.filter(order=order, variant__barcode=barcode).first()
-            
-            returnable = order_item.quantity - order_item.refunded_quantity #-- we calculate the qty the user can still return to mitigate fraud
+
+            #-- if the same item was rung up on more than one line, the return is spread over them
+            returnable = sum(line.quantity - line.refunded_quantity for line in lines) #-- we calculate the qty the user can still return to mitigate fraud
             if qty > returnable:#-- if what the user wants to return is more than the qty he can return
                 raise ValidationError(f"Cannot return {qty}. Only {returnable} eligible.")
-            
-            order_item.refunded_quantity += qty #--- if they are allowed to refund the quantity, we add it to the already refunded total
-            order_item.save()
 
-            variant = order_item.variant
+            remaining = qty
+            for line in lines:
+                take = min(remaining, line.quantity - line.refunded_quantity)
+                if take > 0:
+                    line.refunded_quantity += take #--- we add it to the already refunded total
+                    touched_lines[line.id] = line
+                    total_refund += (line.unit_price * take)
+                    remaining -= take
+
+            returns.append((lines[0].variant_id, qty, is_damaged))
+
+        OrderItem.objects.bulk_update(touched_lines.values(), ['refunded_quantity'])
+
+        #-- lock all affected variants in one go, in id order so concurrent refunds/sales cannot deadlock
+        variants = ProductVariant.objects.select_for_update().order_by('id').in_bulk(
+            {variant_id for variant_id, _, _ in returns}
+        )
+
+        restocked = {}
+        for variant_id, qty, is_damaged in returns:
+            variant = variants[variant_id]
             if is_damaged: #-- we do not touch the existing stock, just create a loss log
-                InventoryLog.objects.create(
+                logs.add(
                     variant=variant, user=user, action='loss', quantity_change=0,
                     stock_after=variant.stock_quantity, note=f"Damaged Return: Order #{order.id}"
                 )
             else:
-                variant = ProductVariant.objects.select_for_update().get(id=variant.id)
-                new_stock = variant.stock_quantity + qty
-                variant.stock_quantity = new_stock
-                variant.save()
-                InventoryLog.objects.create(
+                variant.stock_quantity += qty
+                restocked[variant_id] = variant
+                logs.add(
                     variant=variant, user=user, action='restock', quantity_change=qty,
-                    stock_after=new_stock, note=f"Return: Order #{order.id}"
+                    stock_after=variant.stock_quantity, note=f"Return: Order #{order.id}"
                 )
 
-            total_refund += (order_item.unit_price * qty)
+        ProductVariant.objects.bulk_update(restocked.values(), ['stock_quantity'])
 
-            if order.status == 'completed':
-                order.status = 'refunded' 
-                order.save()
+        if order.customer_id and total_refund:
+            Customer.objects.filter(id=order.customer_id).update(lifetime_value=F('lifetime_value') - total_refund)
+
+        if returns and order.status == 'completed':
+            order.status = 'refunded' 
+            order.save()
 
         return {"order_id": order.id, "refunded_total": total_refund}
     
@@ -416,27 +505,32 @@ def create_purchase_order(user, data):
             status='draft'
         )
 
+        # 2. Resolve every variant in one query, and report all the bad ids at once
+        variant_ids = {item['variant_id'] for item in data['items']}
+        variants = ProductVariant.objects.in_bulk(variant_ids)
+
+        missing = sorted(variant_id for variant_id in variant_ids if variant_id not in variants)
+        if missing:
+            raise ValidationError(f"Variant ID(s) not found: {', '.join(map(str, missing))}.")
+
+        # 3. Create Items
         total_cost = 0
-        
-        # 2. Create Items
+        items = []
         for item in data['items']:
-            try:
-                variant = ProductVariant.objects.get(id=item['variant_id'])
-            except ProductVariant.DoesNotExist:
-                raise ValidationError(f"Variant ID {item['variant_id']} not found.")
-                
             qty = item['quantity']
             cost = item['cost']
-            
-            PurchaseOrderItem.objects.create(
+
+            items.append(PurchaseOrderItem(
                 purchase_order=purchase_order, 
-                variant=variant, 
+                variant=variants[item['variant_id']], 
                 quantity=qty, 
                 unit_cost=cost
-            )
+            ))
             total_cost += (cost * qty)
 
-        # 3. Update Total
+        PurchaseOrderItem.objects.bulk_create(items)
+
+        # 4. Update Total
         purchase_order.total_cost = total_cost
         purchase_order.save()
         
@@ -444,91 +538,532 @@ def create_purchase_order(user, data):
     
     #-- STOCK TAKING
     
-def start_stocktake(user, note=""):
+def start_stocktake(user, note="", category=""):
     """
-    Snapshots the entire inventory state into a new session.
+    Snapshots the inventory state into a new session.
+    If a category is given, only that category is counted.
     """
     with transaction.atomic():
         # 1. Create Session
-        session = StocktakeSession.objects.create(created_by=user, note=note)
+        session = StocktakeSession.objects.create(created_by=user, note=note, category=category or "")
         
-        # 2. Snapshot every product
-        all_variants = ProductVariant.objects.filter(is_active=True) # Assuming you added is_active to Variant or Product
+        # 2. Snapshot every product in scope
+        variants = ProductVariant.objects.filter(is_active=True)
+        if session.category:
+            variants = variants.filter(product__category=session.category)
 
-        # For now, let's grab all:
-        # all_variants = ProductVariant.objects.all()
-        
-        items = []
-        for v in all_variants:
-            items.append(StocktakeItem(
-                session=session,
-                variant=v,
-                expected_quantity=v.stock_quantity,
-                counted_quantity=0 # Default start at 0 (Blind Count) or v.stock_quantity (Guided)
-                # Let's default to 0 to force them to scan/count.
-            ))
-        
-        StocktakeItem.objects.bulk_create(items)
+        _snapshot_stocktake_items(session, variants)
         return session
 
-def update_stocktake_item(session_id, barcode, qty):
+def _snapshot_stocktake_items(session, variants):
     """
-    Updates the count for a specific item in the session.
+    -- copies the variants' current stock into StocktakeItem rows with a single INSERT ... SELECT.
+    nothing is loaded into python, so memory stays flat and a full store snapshot is one statement.
     """
-    try:
-        item = StocktakeItem.objects.get(session_id=session_id, variant__barcode=barcode)
-        item.counted_quantity = qty
-        item.save()
+    snapshot_sql, params = variants.values('id', 'stock_quantity').query.sql_with_params()
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(StocktakeItem._meta.db_table)} "
+            f"(session_id, variant_id, expected_quantity, counted_quantity, moved_quantity, version) "
+            #-- counted_quantity starts at 0 (Blind Count) to force them to scan/count
+            f"SELECT %s, snapshot.id, snapshot.stock_quantity, 0, 0, 0 FROM ({snapshot_sql}) snapshot",
+            (session.id, *params)
+        )
+
+def update_stocktake_item(session_id, barcode, qty, user, zone=""):
+    """
+    Sets this counter's count for a specific item in one zone of the session.
+    Other counters and other zones are untouched, the item total is the sum of every entry.
+    qty is this counter's own count (my_count in the item payload), not the item total.
+    """
+    with transaction.atomic():
+        #-- locked so a count cannot land in a session that is being (or has been) approved
+        try:
+            session = StocktakeSession.objects.select_for_update().get(id=session_id)
+        except StocktakeSession.DoesNotExist:
+            raise ValidationError("Stocktake session not found")
+
+        if session.status != 'in_progress':
+            raise ValidationError("Session already closed")
+
+        try:
+            item = StocktakeItem.objects.get(session_id=session_id, variant__barcode=barcode)
+        except StocktakeItem.DoesNotExist:
+            raise ValidationError("Item not found in this stocktake session")
+
+        #-- what this counter already recorded for the item in this zone, we only write the difference
+        previous = item.counts.filter(counted_by=user, zone=zone).aggregate(total=Sum('quantity'))['total'] or 0
+        delta = int(qty) - previous
+
+        if delta:
+            StocktakeCount.objects.create(session_id=session_id, item=item, counted_by=user, zone=zone, quantity=delta)
+            StocktakeItem.objects.filter(id=item.id).update(
+                counted_quantity=F('counted_quantity') + delta,
+                counted_at=timezone.now(),
+                version=_next_stocktake_version(session)
+            )
+            item.refresh_from_db(fields=['counted_quantity'])
+
         return item
-    except StocktakeItem.DoesNotExist:
-        raise ValidationError("Item not found in this stocktake session")
+
+def _next_stocktake_version(session):
+    """
+    Next change number of a session for the delta feed. The caller holds the session row lock until commit,
+    so numbers are handed out in commit order. Row ids are not: a lower id can commit after a higher one
+    and a device that already polled past it would never see it.
+    """
+    StocktakeSession.objects.filter(id=session.id).update(version=F('version') + 1)
+    session.refresh_from_db(fields=['version'])
+    return session.version
+
+def record_stocktake_scans(session_id, scans, user, zone=""):
+    """
+    Applies a batch of scans from a handheld to the session in one go.
+    scans: [{'barcode': '123', 'quantity': 4}, {'barcode': '123'}, ...], a raw scan event counts as 1.
+    Quantities are added to the running count and recorded as count entries for this counter and zone.
+    Barcodes that are not in the session are skipped and reported back.
+    """
+    with transaction.atomic():
+        try:
+            session = StocktakeSession.objects.select_for_update().get(id=session_id)
+        except StocktakeSession.DoesNotExist:
+            raise ValidationError("Stocktake session not found")
+
+        if session.status != 'in_progress':
+            raise ValidationError("Session already closed")
+
+        #-- the same barcode is scanned many times in an aisle, we add them up first
+        totals = {}
+        for scan in scans:
+            totals[scan['barcode']] = totals.get(scan['barcode'], 0) + scan.get('quantity', 1)
+
+        #-- one query to resolve every barcode in the batch
+        item_ids = dict(
+            session.items.filter(variant__barcode__in=totals.keys()).values_list('variant__barcode', 'id')
+        )
+        unknown = [barcode for barcode in totals if barcode not in item_ids]
+
+        if item_ids:
+            #-- count entries are insert-only, so parallel counters never contend on them
+            StocktakeCount.objects.bulk_create([
+                StocktakeCount(session=session, item_id=item_id, counted_by=user, zone=zone, quantity=totals[barcode])
+                for barcode, item_id in item_ids.items()
+            ])
+            #-- the whole batch shows up in the delta feed under one change number
+            batch_version = _next_stocktake_version(session)
+
+            #-- one UPDATE for the whole batch, the increments are done by the db so concurrent batches do not clash
+            StocktakeItem.objects.filter(id__in=item_ids.values()).update(
+                counted_quantity=F('counted_quantity') + Case(
+                    *[When(id=item_id, then=Value(totals[barcode])) for barcode, item_id in item_ids.items()],
+                    output_field=IntegerField()
+                ),
+                counted_at=timezone.now(),
+                version=batch_version
+            )
+
+        return {
+            "applied": len(item_ids),
+            "scanned": sum(totals[barcode] for barcode in item_ids),
+            "unknown": unknown
+        }
+
+def get_stocktake_items(session_id, status=None, since=None):
+    """
+    Items of a session for the handhelds, optionally filtered.
+    status: 'uncounted', 'counted' or 'variance'. since: only items changed after that version (delta feed).
+    """
+    items = StocktakeItem.objects.select_related('variant__product').filter(session_id=session_id)
+
+    if status == 'uncounted':
+        items = items.filter(counted_at__isnull=True)
+    elif status == 'counted':
+        items = items.filter(counted_at__isnull=False)
+    elif status == 'variance':
+        items = items.exclude(counted_quantity=F('expected_quantity') + F('moved_quantity'))
+
+    if since is not None:
+        items = items.filter(version__gt=since)
+
+    return items
+
+def with_own_counts(items, user, zone=""):
+    """
+    Adds my_count to stocktake items: what `user` has counted of each item in `zone`.
+    That is the number update_stocktake_item expects back, the item total includes everyone else's counts too.
+    """
+    own_counts = StocktakeCount.objects.filter(item=OuterRef('pk'), counted_by=user, zone=zone).values(
+        'item').annotate(total=Sum('quantity')).values('total')
+    return items.annotate(my_count=Coalesce(Subquery(own_counts), 0))
+
+def get_stocktake_version(session_id):
+    """
+    Latest committed change number of a session, devices pass it back as `since` on their next poll.
+    """
+    return StocktakeSession.objects.filter(id=session_id).values_list('version', flat=True).first() or 0
+
+def get_stocktake_count_summary(session_id):
+    """
+    Progress per counter and per zone, e.g. to see which aisles are done.
+    """
+    return StocktakeCount.objects.filter(session_id=session_id).values(
+        'counted_by__username', 'zone'
+    ).annotate(
+        items=Count('item', distinct=True),
+        units=Sum('quantity')
+    ).order_by('zone', 'counted_by__username')
 
 def approve_stocktake(user, session_id):
     """
     Finalizes the count.
-    Updates actual inventory to match the counted values.
+    Applies each item's variance to the live stock, so sales and restocks made while counting are kept.
     Logs discrepancies.
+    Stock is floored at zero, the log records the change actually applied.
+    Everything is set-based: one aggregate over the movements, one locked read and one UPDATE for the stock,
+    and one bulk insert for the logs.
     """
-    with transaction.atomic():
+    with transaction.atomic(), InventoryLogWriter() as logs:
         session = StocktakeSession.objects.select_for_update().get(id=session_id)
         if session.status != 'in_progress':
             raise ValidationError("Session already closed")
-            
-        for item in session.items.all():
-            variance = item.counted_quantity - item.expected_quantity
-            
-            if variance != 0:
-                # We need to adjust the real stock
-                variant = ProductVariant.objects.select_for_update().get(id=item.variant.id)
-                
-                # Logic: We overwrite stock to match the count
-                # But we log the *difference*
-                variant.stock_quantity = item.counted_quantity
-                variant.save()
-                
-                action = 'restock' if variance > 0 else 'loss'
-                note = f"Stocktake #{session.id} (Variance: {variance})"
-                
-                InventoryLog.objects.create(
-                    variant=variant,
+
+        approved_at = timezone.now()
+
+        # 1. What moved between the snapshot and the moment each item was counted (uncounted items: until now)
+        movements = InventoryLog.objects.filter(
+            variant_id=OuterRef('variant_id'),
+            created_at__gt=session.created_at,
+            created_at__lte=Coalesce(OuterRef('counted_at'), Value(approved_at)),
+        ).order_by().values('variant_id').annotate(total=Sum('quantity_change')).values('total')
+        session.items.update(moved_quantity=Coalesce(Subquery(movements), 0))
+
+        # 2. variance = what was counted - what the system expected at the time of the count
+        variance_items = session.items.annotate(
+            variance=F('counted_quantity') - F('expected_quantity') - F('moved_quantity')
+        ).exclude(variance=0)
+        variance_count = variance_items.count()
+
+        if variance_count:
+            #-- lock the variants (in id order, like process_refund) and keep their stock before the change
+            variants = ProductVariant.objects.filter(id__in=variance_items.values('variant_id'))
+            stock_before = dict(variants.select_for_update().order_by('id').values_list('id', 'stock_quantity'))
+
+            # Logic: We add the variance on top of the current stock, in one UPDATE
+            # anything sold after the count stays deducted, but stock never goes below zero
+            # (counted 3 of 5, then 4 sold: the shelf is empty, not at -1)
+            variants.update(
+                stock_quantity=Greatest(F('stock_quantity') + Subquery(
+                    variance_items.filter(variant_id=OuterRef('pk')).values('variance')[:1]
+                ), Value(0))
+            )
+
+            # And we log the change that was actually applied, the note keeps the counted variance
+            for variant_id, variance, stock_after in variance_items.values_list(
+                    'variant_id', 'variance', 'variant__stock_quantity').iterator():
+                logs.add(
+                    variant_id=variant_id,
                     user=user,
-                    action=action,
-                    quantity_change=variance,
-                    stock_after=item.counted_quantity,
-                    note=note
+                    action='restock' if variance > 0 else 'loss',
+                    quantity_change=stock_after - stock_before[variant_id],
+                    stock_after=stock_after,
+                    note=f"Stocktake #{session.id} (Variance: {variance})"
                 )
 
-        has_variance = False
-        for item in session.items.all():
-            variance = item.counted_quantity - item.expected_quantity
-            if variance != 0:
-                has_variance = True
-
         session.status = 'completed'
-        session.completed_at = timezone.now()
+        session.completed_at = approved_at
         session.save()
 
-        msg = "Stocktake completed with discrepancies." if has_variance else "Stocktake completed perfectly."
+        msg = "Stocktake completed with discrepancies." if variance_count else "Stocktake completed perfectly."
         Notification.objects.create(title="Stocktake Finished", message=msg, link="audit")
 
-        return session
\ No newline at end of file
+        return session
+
+
+    #-- INVENTORY LOG ARCHIVAL
+
+def get_log_archive_cutoff(retention_days=None):
+    """
+    Start of the oldest month that must stay in the hot InventoryLog table.
+    Only whole months older than the retention horizon are archived.
+    """
+    if retention_days is None:
+        retention_days = settings.INVENTORY_LOG_RETENTION_DAYS
+    horizon = timezone.localtime(timezone.now() - timedelta(days=retention_days))
+    return horizon.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def archive_inventory_logs(retention_days=None, batch_size=LOG_ARCHIVE_BATCH_SIZE):
+    """
+    Moves InventoryLog rows older than the retention horizon into InventoryLogArchive, oldest month first,
+    and (re)builds the per-variant monthly summaries of every month it touched.
+    Rows are moved in chunks, each chunk in its own short transaction, so the tills are never blocked for long.
+    Returns {month: rows moved}.
+    """
+    cutoff = get_log_archive_cutoff(retention_days)
+    oldest = InventoryLog.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list('created_at', flat=True).first()
+
+    moved = {}
+    if oldest is None:
+        return moved
+
+    month_start = timezone.localtime(oldest).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month_start < cutoff:
+        month_end = _next_month(month_start)
+        month = month_start.date()
+
+        count = 0
+        while True:
+            chunk_count = _archive_log_chunk(month, month_start, month_end, batch_size)
+            if not chunk_count:
+                break
+            count += chunk_count
+
+        if count:
+            _summarise_archived_month(month)
+            moved[month] = count
+
+        month_start = month_end
+
+    return moved
+
+def _next_month(month_start):
+    #-- localtime + replace, so month boundaries follow the store's timezone
+    return timezone.localtime(month_start + timedelta(days=32)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def _archive_log_chunk(month, month_start, month_end, batch_size):
+    """
+    -- copies one chunk of a month into the archive with INSERT ... SELECT, then deletes it from the hot table
+    """
+    with transaction.atomic():
+        ids = list(InventoryLog.objects.filter(
+            created_at__gte=month_start, created_at__lt=month_end
+        ).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        chunk = InventoryLog.objects.filter(id__in=ids)
+        chunk_sql, params = chunk.values(
+            'id', 'variant_id', 'user_id', 'action', 'quantity_change', 'stock_after', 'note', 'created_at'
+        ).query.sql_with_params()
+        qn = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(InventoryLogArchive._meta.db_table)} "
+                f"(month, id, variant_id, user_id, action, quantity_change, stock_after, note, created_at) "
+                f"SELECT %s, chunk.id, chunk.variant_id, chunk.user_id, chunk.action, chunk.quantity_change, "
+                f"chunk.stock_after, chunk.note, chunk.created_at FROM ({chunk_sql}) chunk",
+                (connection.ops.adapt_datefield_value(month), *params)
+            )
+        chunk.delete()
+        return len(ids)
+
+def _summarise_archived_month(month):
+    """
+    -- rebuilds the summaries of one archived month from the archive itself, so re-running is always safe
+    """
+    archived = InventoryLogArchive.objects.filter(month=month)
+    closing_stock = archived.filter(variant_id=OuterRef('variant_id')).order_by('-created_at', '-id').values('stock_after')[:1]
+
+    rows = archived.values('variant_id').annotate(
+        quantity_in=Coalesce(Sum('quantity_change', filter=Q(quantity_change__gt=0)), 0),
+        quantity_out=Coalesce(Sum('quantity_change', filter=Q(quantity_change__lt=0)), 0),
+        entries=Count('id'),
+        closing_stock=Subquery(closing_stock),
+    ).order_by()
+
+    with transaction.atomic():
+        InventoryLogMonthlySummary.objects.filter(month=month).delete()
+        InventoryLogMonthlySummary.objects.bulk_create(
+            [InventoryLogMonthlySummary(month=month, **row) for row in rows.iterator()],
+            batch_size=LOG_ARCHIVE_BATCH_SIZE
+        )
+
+
+    #-- POINT IN TIME STOCK
+
+def record_stock_checkpoint():
+    """
+    Snapshots every variant's stock and cost price into a new checkpoint with one INSERT ... SELECT.
+    Run nightly, so a stock-as-of query never has to replay more than a day of logs.
+
+    get_stock_as_of replays the logs dated after taken_at on top of the snapshot, so both have to describe the
+    same moment: taken_at is the database's now() of the statement that creates the checkpoint, and on postgres
+    the transaction runs at REPEATABLE READ so the INSERT ... SELECT reads the snapshot taken by that same statement.
+    Movements committed before that statement are in the snapshot, later ones are not, and since InventoryLogWriter
+    stamps the log rows as it flushes them, just before commit, their created_at falls on the same side of taken_at.
+    (sqlite: the first write locks out every other writer until commit, which gives the same guarantee)
+    """
+    repeatable_read = connection.vendor == 'postgresql' and not connection.in_atomic_block
+    with transaction.atomic():
+        if repeatable_read: #-- must be the transaction's first statement, so not possible inside an outer atomic block
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+        checkpoint = StockCheckpoint.objects.create(taken_at=Now())
+        checkpoint.refresh_from_db(fields=['taken_at'])
+
+        snapshot_sql, params = ProductVariant.objects.values('id', 'stock_quantity', 'cost_price').query.sql_with_params()
+        qn = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {qn(StockCheckpointItem._meta.db_table)} "
+                f"(checkpoint_id, variant_id, stock_quantity, cost_price) "
+                f"SELECT %s, snapshot.id, snapshot.stock_quantity, snapshot.cost_price FROM ({snapshot_sql}) snapshot",
+                (checkpoint.id, *params)
+            )
+
+        return checkpoint
+
+def get_stock_as_of(as_of):
+    """
+    Stock (and valuation) of every variant at a moment in the past, in one query.
+    - from the nearest checkpoint at or before `as_of`, plus the log deltas between the two
+    - with no checkpoint that old, from the live stock, minus everything logged since `as_of`
+    Deltas come from both the hot and the archived logs, each lookup is bounded by the (variant, created_at) indexes.
+    Returns (checkpoint or None, annotated ProductVariant queryset with stock_as_of, cost_as_of, value_as_of).
+    """
+    checkpoint = StockCheckpoint.objects.filter(taken_at__lte=as_of).order_by('-taken_at').first()
+
+    if checkpoint:
+        checkpoint_items = StockCheckpointItem.objects.filter(checkpoint=checkpoint, variant_id=OuterRef('pk'))
+        base_stock = Coalesce(Subquery(checkpoint_items.values('stock_quantity')[:1]), 0)
+        cost = Coalesce(Subquery(checkpoint_items.values('cost_price')[:1]), F('cost_price'))
+        window = {'created_at__gt': checkpoint.taken_at, 'created_at__lt': as_of}
+        direction = 1 #-- replay forwards from the checkpoint
+    else:
+        base_stock = F('stock_quantity')
+        cost = F('cost_price')
+        window = {'created_at__gte': as_of}
+        direction = -1 #-- unwind backwards from today
+
+    deltas = [
+        Coalesce(Subquery(
+            model.objects.filter(variant_id=OuterRef('pk'), **window).order_by().values('variant_id').annotate(
+                total=Sum('quantity_change')
+            ).values('total')
+        ), 0)
+        for model in (InventoryLog, InventoryLogArchive)
+    ]
+
+    variants = ProductVariant.objects.select_related('product').annotate(
+        stock_as_of=base_stock + direction * (deltas[0] + deltas[1]),
+        cost_as_of=cost,
+    ).annotate(
+        value_as_of=ExpressionWrapper(F('stock_as_of') * F('cost_as_of'), output_field=DecimalField(max_digits=20, decimal_places=2))
+    ).order_by('id')
+
+    return checkpoint, variants
+
+
+#--------- Customer wallet ledger
+
+def post_wallet_transaction(customer_id, amount, kind, user=None, order=None, note="", require_funds=False):
+    """
+    -- moves a customer's wallet balance by a signed amount and appends the ledger row
+    the balance changes with one UPDATE ... SET wallet_balance = wallet_balance + amount, never a read-modify-save,
+    so tills charging the same customer at the same time cannot overwrite each other.
+    require_funds puts the funds check in the same UPDATE (WHERE wallet_balance >= -amount) so it cannot race either.
+    """
+    with transaction.atomic():
+        customers = Customer.objects.filter(id=customer_id)
+        if require_funds:
+            customers = customers.filter(wallet_balance__gte=-amount)
+
+        if not customers.update(wallet_balance=F('wallet_balance') + amount):
+            if require_funds and Customer.objects.filter(id=customer_id).exists():
+                raise ValidationError("Insufficient wallet funds")
+            raise ValidationError("Invalid Customer ID")
+
+        #-- our UPDATE holds the row lock until commit, so this reads exactly the balance we produced
+        balance_after = Customer.objects.filter(id=customer_id).values_list('wallet_balance', flat=True).get()
+
+        return WalletTransaction.objects.create(
+            customer_id=customer_id, order=order, user=user, kind=kind,
+            amount=amount, balance_after=balance_after, note=note
+        )
+
+def record_wallet_deposit(user, customer_id, amount, note=""):
+    #-- customer pays money in, either topping up store credit or paying off debt
+    if amount <= 0:
+        raise ValidationError("Deposit amount must be positive")
+    return post_wallet_transaction(customer_id, amount, 'deposit', user=user, note=note)
+
+def get_wallet_statement(customer_id, start=None, end=None):
+    """
+    -- ledger entries for [start, end) plus the opening and closing balance
+    every row carries balance_after, so the opening balance is just the last row before start (one index seek)
+    instead of summing the customer's whole history
+    """
+    entries = WalletTransaction.objects.filter(customer_id=customer_id)
+    if end:
+        entries = entries.filter(created_at__lt=end)
+
+    opening_balance = Decimal('0.00')
+    if start:
+        previous = entries.filter(created_at__lt=start).order_by('-created_at', '-id').values_list(
+            'balance_after', flat=True).first()
+        if previous is not None:
+            opening_balance = previous
+        entries = entries.filter(created_at__gte=start)
+
+    closing_balance = entries.order_by('-created_at', '-id').values_list('balance_after', flat=True).first()
+    if closing_balance is None:
+        closing_balance = opening_balance
+
+    return {
+        "entries": entries.select_related('user'),
+        "opening_balance": opening_balance,
+        "closing_balance": closing_balance,
+    }
+
+def age_customer_debt(now=None):
+    """
+    -- recomputes every debtor's outstanding debt buckets (0-30 / 31-60 / 60+ days) from the wallet ledger
+    payments clear the oldest debt first, so what is still owed is the most recent charges:
+    each debtor's charges are walked newest first until they cover the balance and bucketed by age.
+    One streamed query for all debtors' charges, batched bulk updates, one UPDATE to clear everyone who paid up.
+    Run nightly, the buckets only move with the calendar.
+    """
+    now = now or timezone.now()
+    bucket_fields = ['debt_0_30', 'debt_31_60', 'debt_over_60']
+
+    with transaction.atomic():
+        debtors = {
+            customer.id: customer
+            for customer in Customer.objects.filter(wallet_balance__lt=0).only('id', 'wallet_balance')
+        }
+        remaining = {}
+        for customer in debtors.values():
+            remaining[customer.id] = -customer.wallet_balance
+            customer.debt_0_30 = customer.debt_31_60 = customer.debt_over_60 = Decimal('0.00')
+            customer.debt_aged_at = now
+
+        charges = WalletTransaction.objects.filter(customer__wallet_balance__lt=0, amount__lt=0).order_by(
+            'customer_id', '-created_at', '-id').values_list('customer_id', 'amount', 'created_at')
+
+        for customer_id, amount, created_at in charges.iterator(chunk_size=2000):
+            owed = min(remaining.get(customer_id, 0), -amount)
+            if owed <= 0:
+                continue
+            remaining[customer_id] -= owed
+
+            age = (now - created_at).days
+            field = 'debt_0_30' if age <= 30 else 'debt_31_60' if age <= 60 else 'debt_over_60'
+            customer = debtors[customer_id]
+            setattr(customer, field, getattr(customer, field) + owed)
+
+        #-- debt the ledger cannot explain (should not happen after the opening balance seed) counts as oldest
+        for customer_id, owed in remaining.items():
+            if owed > 0:
+                debtors[customer_id].debt_over_60 += owed
+
+        Customer.objects.bulk_update(debtors.values(), bucket_fields + ['debt_aged_at'], batch_size=1000)
+
+        cleared = Customer.objects.filter(wallet_balance__gte=0).exclude(
+            debt_0_30=0, debt_31_60=0, debt_over_60=0
+        ).update(debt_0_30=0, debt_31_60=0, debt_over_60=0, debt_aged_at=now)
+
+        return {"debtors": len(debtors), "cleared": cleared}
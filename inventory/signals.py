@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .metrics import count_queries
+
+from .models import StoreSettings
+from .permissions import GROUP_NAMES_ATTR
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_memoized_groups(sender, instance, action, **kwargs):
+    #-- user.groups.add/remove/clear(), drop the memoized role so the same request sees the change
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, User):
+        instance.__dict__.pop(GROUP_NAMES_ATTR, None)
+
+
+@receiver(post_save, sender=StoreSettings)
+@receiver(post_delete, sender=StoreSettings)
+def forget_cached_store_settings(sender, **kwargs):
+    #-- covers the settings screen, setup and admin (including queryset deletes), see StoreSettings.load()
+    cache.delete(StoreSettings.CACHE_KEY)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    #-- fires on every (re)connect, the wrapper list lives on the connection object so only add it once.
+    #-- at the bottom of the stack, so temporary execute_wrapper() blocks still pop their own wrapper
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
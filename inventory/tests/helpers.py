@@ -0,0 +1,37 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.utils import timezone
+
+from inventory.models import InventoryLog, Product, ProductVariant
+
+
+def make_user(username='cashier', manager=False):
+    user = User.objects.create_user(username, password='pass')
+    if manager:
+        user.groups.add(Group.objects.get_or_create(name='Manager')[0])
+    return user
+
+
+def make_variant(barcode, stock=0, price='10.00', cost_price='6.00', name=None):
+    product = Product.objects.create(name=name or f"Product {barcode}", category='General')
+    return ProductVariant.objects.create(
+        product=product, sku=f"SKU-{barcode}", barcode=barcode, name_suffix='Standard',
+        price=Decimal(price), cost_price=Decimal(cost_price), stock_quantity=stock,
+    )
+
+
+def months_ago(months, day):
+    month_start = timezone.now().replace(day=1, hour=12, minute=0, second=0, microsecond=0)
+    for _ in range(months):
+        month_start = (month_start - timedelta(days=1)).replace(day=1)
+    return month_start.replace(day=day)
+
+
+def add_log(variant, user, change, stock_after, created_at, action='sale'):
+    log = InventoryLog.objects.create(
+        variant=variant, user=user, action=action, quantity_change=change, stock_after=stock_after
+    )
+    InventoryLog.objects.filter(id=log.id).update(created_at=created_at)
+    return log
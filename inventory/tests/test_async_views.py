@@ -0,0 +1,52 @@
+from django.test import AsyncClient, TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from inventory.models import Customer, Notification
+from inventory.views import CustomerView, NotificationView, ProductListView
+
+from .helpers import make_user, make_variant
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        make_variant('V1', stock=3, name='Milo Tin')
+
+    async def test_reads_run_on_the_async_orm(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+
+        response = await client.get('/api/scan/V1/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock_quantity'], 3)
+        self.assertEqual((await client.get('/api/scan/NOPE/')).status_code, 404)
+
+        products = (await client.get('/api/products/', {'search': 'milo'})).json()
+        self.assertEqual([row['barcode'] for row in products], ['V1'])
+
+    async def test_reads_need_a_session(self):
+        response = await AsyncClient().get('/api/products/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_writes_go_through_the_drf_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post('/api/customers/', {'name': 'Ada', 'phone': '08030000000'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Customer.objects.filter(phone_normalized='08030000000').exists())
+
+        #-- the sync test client runs the async GET through async_to_sync, as under WSGI
+        self.assertEqual([row['name'] for row in self.client.get('/api/customers/').json()], ['Ada'])
+
+    def test_async_and_drf_reads_agree(self):
+        make_variant('V2', stock=9, name='Milo Refill')
+        Customer.objects.create(name='Ada', phone='08030000000')
+        Notification.objects.create(title='Low Stock Alert', message='Milo Tin is low.')
+        factory = APIRequestFactory()
+        self.client.force_login(self.user)
+
+        for url, view in [('/api/products/?search=milo', ProductListView), ('/api/customers/?search=0803', CustomerView),
+                          ('/api/notifications/', NotificationView)]:
+            request = factory.get(url)
+            force_authenticate(request, user=self.user)
+            self.assertEqual(self.client.get(url).json(), view.as_view()(request).data, url)
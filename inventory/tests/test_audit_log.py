@@ -0,0 +1,39 @@
+from django.test import TestCase
+
+from inventory.models import InventoryLog
+
+from .helpers import make_user, make_variant
+
+
+class AuditLogSearchTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+        self.cashier = make_user('tolu_cashier')
+        self.cola = make_variant('5000112', name='Coca Cola 50cl')
+        self.bread = make_variant('6000223', name='Agege Bread')
+        self.log(self.cola, self.cashier, 'sale', "Order #12")
+        self.log(self.bread, self.manager, 'restock', "PO #3")
+        self.log(self.bread, self.manager, 'loss', "Fell off the shelf")
+        self.client.force_login(self.manager)
+
+    def log(self, variant, user, action, note):
+        InventoryLog.objects.create(variant=variant, user=user, action=action, quantity_change=-1, stock_after=0,
+                                    note=note)
+
+    def search(self, term):
+        response = self.client.get('/api/logs/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['note'] for row in response.json()['results'])
+
+    def test_product_name_search(self):
+        self.assertEqual(self.search('coca'), ["Order #12"])
+        self.assertEqual(self.search('bread'), ["Fell off the shelf", "PO #3"])
+
+    def test_partial_sku_and_exact_barcode(self):
+        self.assertEqual(self.search('5000'), ["Order #12"]) #-- SKU-5000112
+        self.assertEqual(self.search('6000223'), ["Fell off the shelf", "PO #3"])
+
+    def test_username_action_and_note(self):
+        self.assertEqual(self.search('tolu'), ["Order #12"])
+        self.assertEqual(self.search('loss'), ["Fell off the shelf"])
+        self.assertEqual(self.search('shelf'), ["Fell off the shelf"])
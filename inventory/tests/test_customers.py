@@ -0,0 +1,110 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import Customer, WalletTransaction
+from inventory.services import age_customer_debt, post_wallet_transaction, process_purchase
+
+from .helpers import make_user, make_variant
+
+
+class CustomerSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user())
+        Customer.objects.create(name='Ada Obi', phone='0803 123-4567')
+        Customer.objects.create(name='Bola Ade', phone='+234 805 999 0000')
+
+    def search(self, query):
+        response = self.client.get('/api/customers/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['name'] for row in response.json())
+
+    def test_phone_is_stored_normalized(self):
+        customer = Customer.objects.get(name='Ada Obi')
+        self.assertEqual(customer.phone_normalized, '08031234567')
+
+        customer.phone = '0809-000-1111'
+        customer.save(update_fields=['phone'])
+        customer.refresh_from_db()
+        self.assertEqual(customer.phone_normalized, '08090001111')
+
+    def test_phone_prefix_ignores_formatting(self):
+        self.assertEqual(self.search('0803-12'), ['Ada Obi'])
+        self.assertEqual(self.search('+234 805'), ['Bola Ade'])
+        self.assertEqual(self.search('0812'), [])
+
+    def test_name_search(self):
+        self.assertEqual(self.search('ade'), ['Bola Ade'])
+        self.assertEqual(self.search('A'), ['Ada Obi', 'Bola Ade'])
+
+
+class CustomerAggregateTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.customer = Customer.objects.create(name='Ada', phone='08030000000')
+        make_variant('C1', stock=20)
+
+    def test_sales_bump_lifetime_value_and_visits(self):
+        first = process_purchase(self.user, 'cash', [{'barcode': 'C1', 'quantity': 2}], customer_id=self.customer.id)
+        process_purchase(self.user, 'cash', [{'barcode': 'C1', 'quantity': 9}], customer_id=self.customer.id, is_quote=True)
+        last = process_purchase(self.user, 'cash', [{'barcode': 'C1', 'quantity': 1}], customer_id=self.customer.id)
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.lifetime_value, first.total_amount + last.total_amount)
+        self.assertEqual(self.customer.order_count, 2)
+        self.assertEqual(self.customer.last_visit_at, last.created_at)
+
+
+class DebtAgingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.debtor = Customer.objects.create(name='Ada', phone='08030000000')
+        self.paid_up = Customer.objects.create(name='Bola', phone='08030000001')
+
+    def post(self, customer, amount, kind, days_ago):
+        entry = post_wallet_transaction(customer.id, Decimal(amount), kind)
+        WalletTransaction.objects.filter(id=entry.id).update(created_at=self.now - timedelta(days=days_ago))
+
+    def test_payments_clear_the_oldest_debt_first(self):
+        self.post(self.debtor, '-100.00', 'debt', days_ago=90)
+        self.post(self.debtor, '-50.00', 'debt', days_ago=45)
+        self.post(self.debtor, '-20.00', 'debt', days_ago=5)
+        self.post(self.debtor, '120.00', 'deposit', days_ago=1)
+
+        self.assertEqual(age_customer_debt(now=self.now)['debtors'], 1)
+
+        self.debtor.refresh_from_db()
+        self.assertEqual(
+            (self.debtor.debt_0_30, self.debtor.debt_31_60, self.debtor.debt_over_60),
+            (Decimal('20.00'), Decimal('30.00'), Decimal('0.00')),
+        )
+        self.assertEqual(self.debtor.debt_aged_at, self.now)
+
+    def test_settled_customers_are_cleared(self):
+        self.post(self.paid_up, '-40.00', 'debt', days_ago=70)
+        age_customer_debt(now=self.now)
+        self.paid_up.refresh_from_db()
+        self.assertEqual(self.paid_up.debt_over_60, Decimal('40.00'))
+
+        self.post(self.paid_up, '40.00', 'deposit', days_ago=0)
+        self.assertEqual(age_customer_debt(now=self.now), {"debtors": 0, "cleared": 1})
+        self.paid_up.refresh_from_db()
+        self.assertEqual(self.paid_up.debt_over_60, Decimal('0.00'))
+
+    def test_debtor_list(self):
+        self.post(self.debtor, '-100.00', 'debt', days_ago=90)
+        self.post(self.paid_up, '-30.00', 'debt', days_ago=5)
+        Customer.objects.create(name='Chi', phone='08030000002')
+        age_customer_debt(now=self.now)
+        self.client.force_login(make_user(manager=True))
+
+        data = self.client.get('/api/customers/debtors/').json()
+        self.assertEqual([(row['name'], row['outstanding_debt']) for row in data['results']],
+                         [('Ada', '100.00'), ('Bola', '30.00')])
+
+        data = self.client.get('/api/customers/debtors/?ordering=-debt_0_30').json()
+        self.assertEqual([row['name'] for row in data['results']], ['Bola', 'Ada'])
+
+        self.assertEqual(self.client.get('/api/customers/debtors/?ordering=phone').status_code, 400)
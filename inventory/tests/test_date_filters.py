@@ -0,0 +1,34 @@
+from django.test import TestCase
+
+from .helpers import make_user
+
+
+class DateRangeParamTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user(manager=True))
+
+    def test_impossible_date_is_a_bad_request(self):
+        response = self.client.get('/api/po/list/?end_date=2030-02-30')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_date', response.json()['error'])
+
+    def test_malformed_date_is_a_bad_request(self):
+        response = self.client.get('/api/logs/?start_date=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_and_missing_dates_still_filter(self):
+        self.assertEqual(self.client.get('/api/po/list/?start_date=2030-02-28').status_code, 200)
+        self.assertEqual(self.client.get('/api/po/list/').status_code, 200)
+
+
+class StockAsOfDateTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user(manager=True))
+
+    def test_impossible_date_is_a_bad_request(self):
+        response = self.client.get('/api/reports/stock-as-of/?date=2030-02-30')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date', response.json()['error'])
+
+    def test_missing_date_is_a_bad_request(self):
+        self.assertEqual(self.client.get('/api/reports/stock-as-of/').status_code, 400)
@@ -0,0 +1,101 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+
+from inventory import events
+from inventory.events import CommitCursor, EventBroker
+from inventory.models import InventoryLog
+from inventory.services import process_purchase
+
+from .helpers import make_user, make_variant
+
+
+class CommitCursorTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.variant = make_variant('111', stock=10)
+
+    def log(self, **fields):
+        return InventoryLog.objects.create(variant=self.variant, user=self.user, action='sale', quantity_change=-1,
+                                           stock_after=9, **fields)
+
+    def cursor(self, late_commit_seconds=60):
+        #-- started after whatever ids earlier tests used, like the broker does
+        cursor = CommitCursor(late_commit_seconds)
+        cursor.reset(self.log().id)
+        return cursor
+
+    def read_ids(self, cursor):
+        return [row.id for row in cursor.read(InventoryLog.objects.all())]
+
+    def test_row_committed_after_a_higher_id_is_still_read(self):
+        cursor = self.cursor()
+        first, late, second = self.log(), self.log(), self.log()
+        late_id = late.id
+        late.delete() #-- as if its transaction had not committed yet when we read
+
+        self.assertEqual(self.read_ids(cursor), [first.id, second.id])
+        self.assertEqual(list(cursor.gaps), [late_id])
+
+        self.log(id=late_id) #-- ... and now it commits
+        self.assertEqual(self.read_ids(cursor), [late_id])
+        self.assertEqual(cursor.gaps, {})
+        self.assertEqual(self.read_ids(cursor), [])
+
+    def test_holes_are_given_up_after_the_grace_period(self):
+        cursor = self.cursor(late_commit_seconds=0)
+        self.log()
+        hole = self.log()
+        self.log()
+        hole.delete() #-- a rolled back transaction, never fills
+        cursor.read(InventoryLog.objects.all())
+        self.assertEqual(self.read_ids(cursor), [])
+        self.assertEqual(cursor.gaps, {})
+
+    def test_reset_starts_after_existing_rows(self):
+        cursor = self.cursor()
+        new = self.log()
+        self.assertEqual(self.read_ids(cursor), [new.id])
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.user = make_user(manager=True)
+        make_variant('111', stock=20)
+        events.broker = EventBroker(interval=0.05)
+
+    async def test_sale_is_pushed_as_a_stock_event(self):
+        stream = events.event_stream(keepalive=0.5)
+        self.assertEqual(await stream.__anext__(), "retry: 5000\n\n")
+        await asyncio.sleep(0.1) #-- let the poller take its starting point
+        await sync_to_async(process_purchase)(self.user, 'cash', [{'barcode': '111', 'quantity': 3}])
+
+        event = await asyncio.wait_for(stream.__anext__(), timeout=2)
+        self.assertIn('event: stock', event)
+        self.assertIn('"stock_quantity": 17', event)
+        await stream.aclose()
+        self.assertEqual(events.broker.subscribers, set())
+
+    def test_needs_login(self):
+        self.assertEqual(self.client.get('/api/events/').status_code, 403)
+
+
+class BrokerConnectionTests(TransactionTestCase):
+    def test_connection_is_dropped_after_a_database_error(self):
+        broker = EventBroker()
+
+        def failing_poll():
+            connection.ensure_connection()
+            raise OperationalError("server closed the connection unexpectedly")
+
+        #-- patched, the sqlite test db is in memory and ignores close()
+        with mock.patch.object(connection, 'close', wraps=connection.close) as close:
+            with self.assertRaises(OperationalError):
+                broker.with_connection(failing_poll)
+        close.assert_called()
+
+        #-- and the next tick gets a working one
+        self.assertEqual(broker.with_connection(broker.poll), [])
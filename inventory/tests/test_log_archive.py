@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import InventoryLog, InventoryLogArchive, InventoryLogMonthlySummary
+from inventory.services import archive_inventory_logs
+
+from .helpers import add_log, make_user, make_variant, months_ago
+
+
+class LogArchiveTests(TestCase):
+    def setUp(self):
+        self.user = make_user(manager=True)
+        self.variant = make_variant('A1', stock=5)
+        self.old = [
+            add_log(self.variant, self.user, 10, 10, months_ago(7, day=2), action='restock'),
+            add_log(self.variant, self.user, -3, 7, months_ago(7, day=3)),
+            add_log(self.variant, self.user, -1, 6, months_ago(5, day=10)),
+        ]
+        self.recent = add_log(self.variant, self.user, -1, 5, timezone.now() - timedelta(days=2))
+
+    def test_moves_old_months_and_keeps_ids(self):
+        moved = archive_inventory_logs(retention_days=90, batch_size=1)
+
+        self.assertEqual(sorted(moved.values()), [1, 2])
+        self.assertEqual(list(InventoryLog.objects.values_list('id', flat=True)), [self.recent.id])
+        archived = InventoryLogArchive.objects.order_by('id')
+        self.assertEqual([row.id for row in archived], [log.id for log in self.old])
+        self.assertEqual([row.stock_after for row in archived], [10, 7, 6])
+        self.assertEqual(archived[0].month, archived[0].created_at.date().replace(day=1))
+
+    def test_monthly_summaries(self):
+        archive_inventory_logs(retention_days=90)
+
+        summaries = list(InventoryLogMonthlySummary.objects.filter(variant=self.variant).order_by('month'))
+        self.assertEqual(
+            [(s.quantity_in, s.quantity_out, s.entries, s.closing_stock) for s in summaries],
+            [(10, -3, 2, 7), (0, -1, 1, 6)],
+        )
+        self.assertEqual(summaries[0].net_change(), 7)
+
+    def test_rerun_is_a_no_op(self):
+        archive_inventory_logs(retention_days=90)
+        before = list(InventoryLogMonthlySummary.objects.values_list('month', 'entries', 'closing_stock'))
+
+        self.assertEqual(archive_inventory_logs(retention_days=90), {})
+        self.assertEqual(InventoryLogArchive.objects.count(), 3)
+        self.assertEqual(list(InventoryLogMonthlySummary.objects.values_list('month', 'entries', 'closing_stock')), before)
+
+    def test_audit_log_pages_on_into_the_archive(self):
+        archive_inventory_logs(retention_days=90)
+        self.client.force_login(self.user)
+
+        first = self.client.get('/api/logs/').json()
+        self.assertEqual([row['id'] for row in first['results']], [self.recent.id])
+        self.assertIn('archive=1', first['next'])
+
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['id'] for row in second['results']], [log.id for log in reversed(self.old)])
@@ -0,0 +1,42 @@
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from inventory.log_writer import InventoryLogWriter
+from inventory.models import InventoryLog
+from inventory.services import process_purchase
+
+from .helpers import make_user, make_variant
+
+
+class InventoryLogWriterTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.variant = make_variant('L1', stock=10)
+
+    def test_flushes_all_entries_in_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic(), InventoryLogWriter() as logs:
+                for n in range(1, 4):
+                    logs.add(variant=self.variant, user=self.user, action='sale', quantity_change=-1, stock_after=10 - n)
+                self.assertFalse(InventoryLog.objects.exists())
+
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(list(InventoryLog.objects.order_by('id').values_list('stock_after', flat=True)), [9, 8, 7])
+
+    def test_discards_entries_when_the_block_fails(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic(), InventoryLogWriter() as logs:
+                logs.add(variant=self.variant, user=self.user, action='sale', quantity_change=-1, stock_after=9)
+                raise RuntimeError
+        self.assertFalse(InventoryLog.objects.exists())
+
+    def test_sale_logs_every_line(self):
+        make_variant('L2', stock=10)
+        order = process_purchase(self.user, 'cash', [{'barcode': 'L1', 'quantity': 2}, {'barcode': 'L2', 'quantity': 3}])
+
+        logs = InventoryLog.objects.order_by('id')
+        self.assertEqual([(log.variant.barcode, log.quantity_change, log.stock_after) for log in logs],
+                         [('L1', -2, 8), ('L2', -3, 7)])
+        self.assertTrue(all(log.note == f"Order #{order.id}" for log in logs))
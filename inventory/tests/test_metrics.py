@@ -0,0 +1,42 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from inventory.metrics import REQUESTS_TOTAL, Histogram
+
+from .helpers import make_user
+
+
+class HistogramTests(SimpleTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', 'Test.', (0.1, 1), ('route',))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, 'a"b')
+
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{route="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{route="a\\"b",le="1"} 2',
+            'test_seconds_bucket{route="a\\"b",le="+Inf"} 3',
+            'test_seconds_sum{route="a\\"b"} 5.55',
+            'test_seconds_count{route="a\\"b"} 3',
+        ])
+
+
+class MetricsEndpointTests(TestCase):
+    def test_requests_are_recorded_per_route(self):
+        self.client.force_login(make_user(manager=True))
+        before = REQUESTS_TOTAL.series.get(('customers', 'GET', 200), 0)
+
+        self.client.get('/api/customers/?search=0803')
+        self.client.get('/api/customers/?search=ada')
+        self.assertEqual(REQUESTS_TOTAL.series[('customers', 'GET', 200)], before + 2)
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('inventro_request_db_queries_count{route="customers",method="GET"}', body)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_access(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+        self.client.force_login(make_user())
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import InventoryLog, PurchaseOrder, PurchaseOrderItem, Supplier
+from inventory.services import create_purchase_order, receive_purchase_order_items
+
+from .helpers import make_user, make_variant
+
+
+class ReceivePurchaseOrderItemsTests(TestCase):
+    def setUp(self):
+        self.user = make_user(manager=True)
+        self.supplier = Supplier.objects.create(name='Supplier', contact_person='Ade')
+        self.cola = make_variant('111', stock=3)
+        self.bread = make_variant('222')
+
+    def create_order(self, lines):
+        return create_purchase_order(self.user, {'supplier_id': self.supplier.id, 'items': [
+            {'variant_id': variant.id, 'quantity': qty, 'cost': cost} for variant, qty, cost in lines
+        ]})
+
+    def test_partial_receipt_spreads_over_lines(self):
+        purchase_order = self.create_order([(self.cola, 10, 6), (self.bread, 5, 7), (self.cola, 2, 8)])
+
+        purchase_order = receive_purchase_order_items(self.user, purchase_order.id, [
+            {'barcode': '111', 'quantity': 4}, {'barcode': '111', 'quantity': 7},
+        ])
+
+        self.assertEqual(purchase_order.status, 'partial')
+        self.assertEqual(
+            list(PurchaseOrderItem.objects.filter(variant=self.cola).order_by('id').values_list('received_quantity', flat=True)),
+            [10, 1]
+        )
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock_quantity, 14)
+        self.assertEqual(InventoryLog.objects.filter(variant=self.cola, action='restock').count(), 2)
+
+    def test_completes_when_nothing_outstanding(self):
+        purchase_order = self.create_order([(self.cola, 2, 6), (self.bread, 3, 7)])
+        purchase_order = receive_purchase_order_items(self.user, purchase_order.id, [
+            {'barcode': '111', 'quantity': 2}, {'barcode': '222', 'quantity': 3},
+        ])
+        self.assertEqual(purchase_order.status, 'received')
+        self.assertIsNotNone(purchase_order.received_date)
+
+    def test_rejects_over_receipt_and_unknown_items(self):
+        purchase_order = self.create_order([(self.cola, 2, 6)])
+        with self.assertRaises(ValidationError):
+            receive_purchase_order_items(self.user, purchase_order.id, [{'barcode': '111', 'quantity': 3}])
+        with self.assertRaises(ValidationError):
+            receive_purchase_order_items(self.user, purchase_order.id, [{'barcode': '222', 'quantity': 1}])
+        self.assertFalse(PurchaseOrderItem.objects.filter(received_quantity__gt=0).exists())
+
+    def test_line_updates_are_one_statement(self):
+        variants = [make_variant(f"9{i:02d}") for i in range(20)]
+        purchase_order = self.create_order([(variant, 5, 3) for variant in variants])
+
+        with CaptureQueriesContext(connection) as queries:
+            receive_purchase_order_items(self.user, purchase_order.id, [
+                {'barcode': variant.barcode, 'quantity': 2} for variant in variants
+            ])
+
+        line_updates = [q['sql'] for q in queries.captured_queries
+                        if q['sql'].startswith('UPDATE') and 'purchaseorderitem' in q['sql']]
+        self.assertEqual(len(line_updates), 1)
+        self.assertEqual(PurchaseOrderItem.objects.filter(received_quantity=2).count(), 20)
+
+
+class CreatePurchaseOrderTests(TestCase):
+    def setUp(self):
+        self.user = make_user(manager=True)
+        self.supplier = Supplier.objects.create(name='Supplier', contact_person='Ade')
+
+    def create_order(self, variant_ids):
+        return create_purchase_order(self.user, {'supplier_id': self.supplier.id, 'items': [
+            {'variant_id': variant_id, 'quantity': 2, 'cost': Decimal('5.00')} for variant_id in variant_ids
+        ]})
+
+    def test_lines_and_total(self):
+        variants = [make_variant(f"C{n}") for n in range(3)]
+        purchase_order = self.create_order([v.id for v in variants])
+
+        self.assertEqual(purchase_order.total_cost, Decimal('30.00'))
+        self.assertEqual(sorted(purchase_order.items.values_list('variant_id', flat=True)), sorted(v.id for v in variants))
+
+    def test_query_count_does_not_grow_with_the_lines(self):
+        variants = [make_variant(f"C{n}") for n in range(30)]
+        #-- savepoint, supplier, header insert, one variant lookup, one bulk insert of the lines, total update, release
+        with self.assertNumQueries(7):
+            self.create_order([variants[0].id])
+        with self.assertNumQueries(7):
+            self.create_order([v.id for v in variants])
+
+    def test_reports_every_missing_id_in_numeric_order(self):
+        variant = make_variant('C1')
+        missing = [variant.id + 10, variant.id + 9, variant.id + 100]
+
+        with self.assertRaises(ValidationError) as ctx:
+            self.create_order([variant.id, *missing])
+        self.assertEqual(str(ctx.exception.detail[0]),
+                         f"Variant ID(s) not found: {variant.id + 9}, {variant.id + 10}, {variant.id + 100}.")
+        self.assertFalse(PurchaseOrderItem.objects.exists())
+
+
+class PurchaseOrderListTests(TestCase):
+    def test_next_link_walks_every_order(self):
+        user = make_user(manager=True)
+        supplier = Supplier.objects.create(name='Supplier', contact_person='Ade')
+        created = {PurchaseOrder.objects.create(supplier=supplier, created_by=user).id for _ in range(55)}
+        self.client.force_login(user)
+
+        seen, url = [], '/api/po/list/'
+        while url:
+            data = self.client.get(url).json()
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(len(seen), 55)
+        self.assertEqual(set(seen), created)
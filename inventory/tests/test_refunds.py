@@ -0,0 +1,81 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import Customer, InventoryLog, OrderItem
+from inventory.services import process_purchase, process_refund
+
+from .helpers import make_user, make_variant
+
+
+class RefundTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.variants = [make_variant(f"R{n}", stock=20) for n in range(3)]
+
+    def sell(self, quantity=2, customer=None):
+        items = [{'barcode': v.barcode, 'quantity': quantity} for v in self.variants]
+        return process_purchase(self.user, 'cash', items, customer_id=customer and customer.id)
+
+    def test_refund_restocks_and_marks_lines(self):
+        order = self.sell()
+        result = process_refund(self.user, order.id, [{'barcode': 'R0', 'quantity': 2}, {'barcode': 'R1', 'quantity': 1}])
+
+        self.assertEqual(result['refunded_total'], Decimal('30.00'))
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'refunded')
+        self.assertEqual(
+            dict(order.items.values_list('variant__barcode', 'refunded_quantity')),
+            {'R0': 2, 'R1': 1, 'R2': 0},
+        )
+        for variant, stock in zip(self.variants, [20, 19, 18]):
+            variant.refresh_from_db()
+            self.assertEqual(variant.stock_quantity, stock)
+
+    def test_damaged_return_logs_a_loss_without_restocking(self):
+        order = self.sell()
+        process_refund(self.user, order.id, [{'barcode': 'R0', 'quantity': 1, 'is_damaged': True}])
+
+        self.variants[0].refresh_from_db()
+        self.assertEqual(self.variants[0].stock_quantity, 18)
+        log = InventoryLog.objects.filter(variant=self.variants[0]).latest('id')
+        self.assertEqual((log.action, log.quantity_change), ('loss', 0))
+
+    def test_return_spreads_over_repeated_lines(self):
+        order = self.sell(quantity=1)
+        OrderItem.objects.create(order=order, variant=self.variants[0], quantity=2, unit_price=Decimal('10.00'))
+
+        process_refund(self.user, order.id, [{'barcode': 'R0', 'quantity': 3}])
+        self.assertEqual(
+            list(order.items.filter(variant=self.variants[0]).order_by('id').values_list('refunded_quantity', flat=True)),
+            [1, 2],
+        )
+
+    def test_cannot_return_more_than_was_sold(self):
+        order = self.sell()
+        process_refund(self.user, order.id, [{'barcode': 'R0', 'quantity': 1}])
+
+        with self.assertRaisesMessage(ValidationError, "Only 1 eligible"):
+            process_refund(self.user, order.id, [{'barcode': 'R0', 'quantity': 2}])
+        with self.assertRaisesMessage(ValidationError, "not in this order"):
+            process_refund(self.user, order.id, [{'barcode': 'NOPE', 'quantity': 1}])
+
+    def test_refund_reduces_customer_lifetime_value(self):
+        customer = Customer.objects.create(name='Ada', phone='08030000000')
+        order = self.sell(customer=customer)
+        process_refund(self.user, order.id, [{'barcode': 'R2', 'quantity': 2}])
+
+        customer.refresh_from_db()
+        self.assertEqual(customer.lifetime_value, Decimal('40.00'))
+
+    def test_query_count_does_not_grow_with_the_return(self):
+        def refund_queries(barcodes):
+            order = self.sell()
+            with CaptureQueriesContext(connection) as ctx:
+                process_refund(self.user, order.id, [{'barcode': b, 'quantity': 1} for b in barcodes])
+            return len(ctx.captured_queries)
+
+        self.assertEqual(refund_queries(['R0']), refund_queries(['R0', 'R1', 'R2']))
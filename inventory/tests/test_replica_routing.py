@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from inventory.models import ProductVariant
+from inventory.routers import (
+    REPLICA_PIN_COOKIE,
+    ReadReplicaRouter,
+    get_read_alias,
+    read_from_replica,
+    use_replica,
+)
+
+from .helpers import make_user, make_variant
+
+
+def with_replica(configured=True):
+    #-- the replica alias only exists when DB_REPLICA_URL is set, so the tests fake it being there
+    return mock.patch('inventory.routers.replica_configured', return_value=configured)
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    router = ReadReplicaRouter()
+
+    def test_inventory_reads_follow_the_flag(self):
+        with with_replica():
+            self.assertIsNone(self.router.db_for_read(ProductVariant))
+            with use_replica():
+                self.assertEqual(self.router.db_for_read(ProductVariant), 'replica')
+                self.assertEqual(get_read_alias(), 'replica')
+                self.assertIsNone(self.router.db_for_read(User)) #-- auth tables never move
+                self.assertEqual(self.router.db_for_write(ProductVariant), 'default')
+            self.assertEqual(get_read_alias(), 'default')
+
+    def test_nothing_moves_without_a_replica(self):
+        with with_replica(False), use_replica():
+            self.assertIsNone(self.router.db_for_read(ProductVariant))
+            self.assertEqual(get_read_alias(), 'default')
+
+
+class ReadFromReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        @read_from_replica
+        def view(request):
+            return get_read_alias()
+        self.view = view
+
+    def test_get_reads_from_the_replica(self):
+        with with_replica():
+            self.assertEqual(self.view(self.factory.get('/')), 'replica')
+            self.assertEqual(get_read_alias(), 'default')
+
+    def test_writes_and_pinned_browsers_stay_on_the_primary(self):
+        pinned = self.factory.get('/')
+        pinned.COOKIES[REPLICA_PIN_COOKIE] = '1'
+
+        with with_replica():
+            self.assertEqual(self.view(self.factory.post('/')), 'default')
+            self.assertEqual(self.view(pinned), 'default')
+
+
+class ReplicaPinMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user())
+        make_variant('P1', stock=5)
+
+    def sell(self, quantity=1):
+        return self.client.post('/api/purchase/', {'payment_method': 'cash', 'items': [{'barcode': 'P1', 'quantity': quantity}]},
+                                content_type='application/json')
+
+    def test_successful_write_pins_the_browser(self):
+        with mock.patch('inventory.middleware.replica_configured', return_value=True):
+            response = self.sell()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.cookies[REPLICA_PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_failed_write_and_no_replica_do_not_pin(self):
+        with mock.patch('inventory.middleware.replica_configured', return_value=True):
+            self.assertNotIn(REPLICA_PIN_COOKIE, self.sell(quantity=50).cookies)
+        self.assertNotIn(REPLICA_PIN_COOKIE, self.sell().cookies)
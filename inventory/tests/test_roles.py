@@ -0,0 +1,47 @@
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from inventory.permissions import get_role, is_manager
+
+from .helpers import make_user
+
+
+class RoleTests(TestCase):
+    def test_groups_are_resolved_once_per_user_object(self):
+        user = make_user(manager=True)
+        user = User.objects.get(id=user.id)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(is_manager(user))
+            self.assertEqual(get_role(user), 'Manager')
+            self.assertTrue(is_manager(user))
+
+    def test_group_changes_drop_the_memo(self):
+        user = make_user()
+        self.assertFalse(is_manager(user))
+
+        user.groups.add(Group.objects.get_or_create(name='Manager')[0])
+        self.assertTrue(is_manager(user))
+        user.groups.clear()
+        self.assertEqual(get_role(user), 'Staff')
+
+    def test_owner(self):
+        owner = User.objects.create_superuser('owner', password='pass')
+        self.assertTrue(is_manager(owner))
+        self.assertEqual(get_role(owner), 'Owner')
+
+    def test_staff_list_query_count_is_flat(self):
+        self.client.force_login(make_user('boss', manager=True))
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/api/staff/')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        baseline = list_queries()
+        for n in range(5):
+            make_user(f'cashier{n}', manager=n % 2 == 0)
+        self.assertEqual(list_queries(), baseline)
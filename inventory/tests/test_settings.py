@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from inventory.models import StoreSettings
+
+from .helpers import make_user
+
+
+class StoreSettingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_load_is_cached_after_first_read(self):
+        StoreSettings.load()
+        with self.assertNumQueries(0):
+            StoreSettings.load()
+
+    def test_update_is_visible_on_next_read(self):
+        self.client.force_login(make_user(manager=True))
+        self.assertEqual(self.client.get('/api/settings/').json()['store_name'], 'My Store')
+
+        response = self.client.post('/api/settings/', {'store_name': 'Corner Shop'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/settings/').json()['store_name'], 'Corner Shop')
+
+    def test_cashier_cannot_update(self):
+        self.client.force_login(make_user())
+        response = self.client.post('/api/settings/', {'store_name': 'Corner Shop'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_setup_creates_owner_and_names_store(self):
+        response = self.client.post('/setup/', {'username': 'owner', 'password': 'pass', 'store_name': 'Corner Shop'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(User.objects.get(username='owner').is_superuser)
+        self.assertEqual(StoreSettings.load().store_name, 'Corner Shop')
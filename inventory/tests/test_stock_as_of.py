@@ -0,0 +1,106 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from inventory.models import StockCheckpoint
+from inventory.services import archive_inventory_logs, get_stock_as_of, record_stock_checkpoint
+
+from .helpers import add_log, make_user, make_variant, months_ago
+
+
+class StockAsOfTests(TestCase):
+    """
+    stock history of one variant: 10 received, then sales leave 7, 6 and today 5.
+    the first three logs are archived, so every lookup has to read both tables
+    """
+    def setUp(self):
+        self.user = make_user(manager=True)
+        self.variant = make_variant('S1', stock=5)
+        add_log(self.variant, self.user, 10, 10, months_ago(7, day=2), action='restock')
+        add_log(self.variant, self.user, -3, 7, months_ago(7, day=3))
+        add_log(self.variant, self.user, -1, 6, months_ago(5, day=10))
+        add_log(self.variant, self.user, -1, 5, timezone.now() - timedelta(days=2))
+        archive_inventory_logs(retention_days=90)
+
+    def stock_at(self, as_of):
+        checkpoint, variants = get_stock_as_of(as_of)
+        return checkpoint, variants.get(id=self.variant.id)
+
+    def test_unwinds_from_live_stock_without_a_checkpoint(self):
+        checkpoint, variant = self.stock_at(months_ago(6, day=1))
+        self.assertIsNone(checkpoint)
+        self.assertEqual(variant.stock_as_of, 7)
+        self.assertEqual(variant.value_as_of, Decimal('42.00'))
+
+        self.assertEqual(self.stock_at(months_ago(8, day=1))[1].stock_as_of, 0)
+        self.assertEqual(self.stock_at(timezone.now())[1].stock_as_of, 5)
+
+    def test_replays_forward_from_the_nearest_checkpoint(self):
+        checkpoint = record_stock_checkpoint()
+        self.assertEqual(checkpoint.items.get(variant=self.variant).stock_quantity, 5)
+
+        #-- pretend it was taken six months ago, when the till held 7
+        StockCheckpoint.objects.filter(id=checkpoint.id).update(taken_at=months_ago(6, day=1))
+        checkpoint.items.update(stock_quantity=7, cost_price=Decimal('4.00'))
+
+        used, variant = self.stock_at(timezone.now() - timedelta(days=30))
+        self.assertEqual(used, checkpoint)
+        self.assertEqual(variant.stock_as_of, 6)
+        self.assertEqual(variant.cost_as_of, Decimal('4.00'))
+
+        #-- anything before the checkpoint still unwinds from today
+        used, variant = self.stock_at(months_ago(7, day=10))
+        self.assertIsNone(used)
+        self.assertEqual(variant.stock_as_of, 7)
+
+    def test_report_endpoint(self):
+        self.client.force_login(self.user)
+        day = months_ago(6, day=1).date()
+
+        data = self.client.get(f'/api/reports/stock-as-of/?date={day}').json()
+        self.assertEqual([row['stock_quantity'] for row in data['results']], [7])
+        self.assertEqual(data['total_units'], 7)
+
+
+class StockAsOfCommandTests(TestCase):
+    def test_writes_the_csv(self):
+        make_variant('S1', stock=4)
+        out = StringIO()
+        call_command('stock_as_of', str(timezone.localdate()), stdout=out)
+        self.assertIn('SKU-S1', out.getvalue())
+
+    def test_bad_dates_are_command_errors(self):
+        for value in ('2025-02-30', 'yesterday'):
+            with self.assertRaisesMessage(CommandError, f"Invalid date '{value}'"):
+                call_command('stock_as_of', value, stdout=StringIO())
+
+
+class StockCheckpointTests(TestCase):
+    def test_snapshot_and_timestamp(self):
+        variant = make_variant('K1', stock=9)
+        before = timezone.now()
+        checkpoint = record_stock_checkpoint()
+
+        self.assertLessEqual(before - timedelta(seconds=1), checkpoint.taken_at)
+        self.assertLessEqual(checkpoint.taken_at, timezone.now() + timedelta(seconds=1))
+        self.assertEqual(StockCheckpoint.objects.get(id=checkpoint.id).taken_at, checkpoint.taken_at)
+        self.assertEqual(list(checkpoint.items.values_list('variant_id', 'stock_quantity')), [(variant.id, 9)])
+
+
+@skipUnless(connection.vendor == 'postgresql', "isolation levels are postgres only")
+class StockCheckpointIsolationTests(TransactionTestCase):
+    def test_snapshot_runs_at_repeatable_read(self):
+        make_variant('K1', stock=9)
+        with CaptureQueriesContext(connection) as ctx:
+            record_stock_checkpoint()
+
+        statements = [q['sql'] for q in ctx.captured_queries if q['sql'] != 'BEGIN']
+        self.assertEqual(statements[0], "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        self.assertIn('STATEMENT_TIMESTAMP()', statements[1])
@@ -0,0 +1,284 @@
+import threading
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import InventoryLog, Notification, Product, ProductVariant, StocktakeCount, StocktakeSession
+from inventory.services import (approve_stocktake, get_stocktake_items, get_stocktake_version, record_stocktake_scans,
+                                start_stocktake, update_stocktake_item)
+
+from .helpers import make_user, make_variant
+
+
+class StocktakeCountTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+        self.other = make_user('second', manager=True)
+        self.cola = make_variant('111', stock=10)
+        self.bread = make_variant('222', stock=4)
+        self.session = start_stocktake(self.manager, 'weekly count')
+
+    def item(self, barcode):
+        return self.session.items.get(variant__barcode=barcode)
+
+    def test_counters_and_zones_add_up(self):
+        update_stocktake_item(self.session.id, '111', 4, self.manager, zone='Aisle 1')
+        update_stocktake_item(self.session.id, '111', 3, self.other, zone='Aisle 1')
+        update_stocktake_item(self.session.id, '111', 2, self.manager, zone='Back room')
+        self.assertEqual(self.item('111').counted_quantity, 9)
+
+        #-- a counter correcting their own count only moves their share
+        update_stocktake_item(self.session.id, '111', 1, self.manager, zone='Aisle 1')
+        self.assertEqual(self.item('111').counted_quantity, 6)
+        self.assertEqual(StocktakeCount.objects.filter(item__variant=self.cola).count(), 4)
+
+    def test_scan_batches_increment(self):
+        result = record_stocktake_scans(self.session.id, [
+            {'barcode': '111'}, {'barcode': '111', 'quantity': 4}, {'barcode': '999'},
+        ], self.manager, zone='Aisle 1')
+        self.assertEqual(result, {"applied": 1, "scanned": 5, "unknown": ['999']})
+        record_stocktake_scans(self.session.id, [{'barcode': '111'}], self.other)
+        self.assertEqual(self.item('111').counted_quantity, 6)
+
+    def test_closed_session_rejects_counts(self):
+        update_stocktake_item(self.session.id, '111', 8, self.manager)
+        approve_stocktake(self.manager, self.session.id)
+
+        with self.assertRaises(ValidationError):
+            update_stocktake_item(self.session.id, '111', 50, self.manager)
+        with self.assertRaises(ValidationError):
+            record_stocktake_scans(self.session.id, [{'barcode': '111'}], self.manager)
+        self.assertEqual(self.item('111').counted_quantity, 8)
+        self.assertEqual(ProductVariant.objects.get(id=self.cola.id).stock_quantity, 8)
+
+    def test_payload_carries_own_count(self):
+        update_stocktake_item(self.session.id, '111', 5, self.other)
+        update_stocktake_item(self.session.id, '111', 2, self.manager)
+        self.client.force_login(self.manager)
+
+        items = {item['barcode']: item for item in self.client.get(f'/api/stocktake/{self.session.id}/').json()['items']}
+        self.assertEqual((items['111']['counted_quantity'], items['111']['my_count']), (7, 2))
+
+        #-- what the count button sends for one more tap: own count + 1, the total grows by exactly one
+        response = self.client.post(f'/api/stocktake/{self.session.id}/',
+                                    {'barcode': '111', 'quantity': items['111']['my_count'] + 1},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.item('111').counted_quantity, 8)
+
+        listed = self.client.get(f'/api/stocktake/{self.session.id}/items/?status=counted').json()['results']
+        self.assertEqual([(item['barcode'], item['my_count']) for item in listed], [('111', 3)])
+
+
+class StocktakeSnapshotTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+        self.cola = make_variant('111', stock=10)
+        self.juice = make_variant('222', stock=4)
+        self.bread = make_variant('333', stock=6)
+        Product.objects.filter(variants__in=[self.cola, self.juice]).update(category='Drinks')
+        ProductVariant.objects.filter(id=self.juice.id).update(is_active=False)
+
+    def snapshot(self, session):
+        return sorted(session.items.values_list('variant__barcode', 'expected_quantity'))
+
+    def test_snapshot_copies_active_stock(self):
+        self.assertEqual(self.snapshot(start_stocktake(self.manager)), [('111', 10), ('333', 6)])
+
+    def test_category_scopes_the_snapshot(self):
+        session = start_stocktake(self.manager, category='Drinks')
+        self.assertEqual(session.category, 'Drinks')
+        self.assertEqual(self.snapshot(session), [('111', 10)])
+
+        self.client.force_login(self.manager)
+        response = self.client.post('/api/stocktake/', {'category': 'General'}, content_type='application/json')
+        self.assertEqual(self.snapshot(StocktakeSession.objects.get(id=response.json()['id'])), [('333', 6)])
+
+    def test_snapshot_is_one_statement_whatever_the_scope(self):
+        for n in range(20):
+            make_variant(f"9{n}", stock=n)
+        #-- savepoint, session insert, the INSERT ... SELECT, release
+        with self.assertNumQueries(4):
+            start_stocktake(self.manager)
+        with self.assertNumQueries(4):
+            start_stocktake(self.manager, category='Drinks')
+
+
+class StocktakeApprovalTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+        self.cola = make_variant('111', stock=10)
+
+    def sell(self, qty):
+        stock_after = ProductVariant.objects.get(id=self.cola.id).stock_quantity - qty
+        ProductVariant.objects.filter(id=self.cola.id).update(stock_quantity=stock_after)
+        InventoryLog.objects.create(variant=self.cola, user=self.manager, action='sale', quantity_change=-qty,
+                                    stock_after=stock_after)
+
+    def test_sale_before_the_count_is_expected(self):
+        session = start_stocktake(self.manager)
+        self.sell(2)
+        update_stocktake_item(session.id, '111', 7, self.manager)
+
+        approve_stocktake(self.manager, session.id)
+
+        #-- expected 10, moved -2 before the count, counted 7: one unit missing off the live 8
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock_quantity, 7)
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'completed')
+
+    def test_sale_after_the_count_stays_deducted(self):
+        session = start_stocktake(self.manager)
+        update_stocktake_item(session.id, '111', 7, self.manager)
+        self.sell(2)
+
+        approve_stocktake(self.manager, session.id)
+
+        #-- counted 7 of the expected 10, the later sale of 2 comes off that
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock_quantity, 5)
+
+    def test_sales_after_the_count_never_take_stock_below_zero(self):
+        session = start_stocktake(self.manager)
+        update_stocktake_item(session.id, '111', 3, self.manager)
+        self.sell(8)
+
+        approve_stocktake(self.manager, session.id)
+
+        #-- counted 3 of the expected 10 (variance -7) but only 2 were left on the shelf to lose
+        self.cola.refresh_from_db()
+        self.assertEqual(self.cola.stock_quantity, 0)
+        log = InventoryLog.objects.filter(variant=self.cola, action='loss').get()
+        self.assertEqual((log.quantity_change, log.stock_after), (-2, 0))
+        self.assertIn('Variance: -7', log.note)
+
+
+class StocktakeApprovalSetBasedTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+
+    def approve_with_counts(self, counts):
+        #-- counts: {barcode: (stock, counted)}
+        for barcode, (stock, _) in counts.items():
+            make_variant(barcode, stock=stock)
+        session = start_stocktake(self.manager)
+        record_stocktake_scans(session.id, [
+            {'barcode': barcode, 'quantity': counted} for barcode, (_, counted) in counts.items() if counted
+        ], self.manager)
+        return session
+
+    def test_variance_logs(self):
+        session = self.approve_with_counts({'111': (10, 12), '222': (5, 5), '333': (8, 3), '444': (2, 0)})
+        ProductVariant.objects.filter(barcode='333').update(stock_quantity=1) #-- 7 sold after the count, unlogged
+
+        approve_stocktake(self.manager, session.id)
+
+        logs = InventoryLog.objects.filter(note__startswith=f"Stocktake #{session.id}").order_by('variant__barcode')
+        self.assertEqual([(log.variant.barcode, log.action, log.quantity_change, log.stock_after, log.note) for log in logs], [
+            ('111', 'restock', 2, 12, f"Stocktake #{session.id} (Variance: 2)"),
+            ('333', 'loss', -1, 0, f"Stocktake #{session.id} (Variance: -5)"), #-- floored at zero
+            ('444', 'loss', -2, 0, f"Stocktake #{session.id} (Variance: -2)"),
+        ])
+        self.assertEqual(dict(ProductVariant.objects.values_list('barcode', 'stock_quantity')),
+                         {'111': 12, '222': 5, '333': 0, '444': 0})
+        self.assertEqual(Notification.objects.get(title="Stocktake Finished").message, "Stocktake completed with discrepancies.")
+
+    def test_perfect_count_writes_nothing(self):
+        session = self.approve_with_counts({'111': (10, 10), '222': (3, 3)})
+        approve_stocktake(self.manager, session.id)
+        self.assertFalse(InventoryLog.objects.exists())
+        self.assertEqual(Notification.objects.get(title="Stocktake Finished").message, "Stocktake completed perfectly.")
+
+    def test_query_count_does_not_grow_with_the_items(self):
+        def approval_queries(size, prefix):
+            session = self.approve_with_counts({f"{prefix}{n}": (5, n + 1) for n in range(size)})
+            with CaptureQueriesContext(connection) as ctx:
+                approve_stocktake(self.manager, session.id)
+            StocktakeSession.objects.filter(id=session.id).delete()
+            return len(ctx.captured_queries)
+
+        self.assertEqual(approval_queries(2, 'A'), approval_queries(25, 'B'))
+
+
+class StocktakeDeltaFeedTests(TestCase):
+    def setUp(self):
+        self.manager = make_user('manager', manager=True)
+        for barcode in ('111', '222', '333'):
+            make_variant(barcode, stock=5)
+        self.session = start_stocktake(self.manager)
+
+    def changed_since(self, version):
+        return sorted(get_stocktake_items(self.session.id, since=version).values_list('variant__barcode', flat=True))
+
+    def test_versions_follow_changes_per_session(self):
+        other_session = start_stocktake(self.manager)
+        update_stocktake_item(other_session.id, '111', 9, self.manager) #-- another session does not move ours
+
+        self.assertEqual(get_stocktake_version(self.session.id), 0)
+        update_stocktake_item(self.session.id, '111', 1, self.manager)
+        seen = get_stocktake_version(self.session.id)
+        self.assertEqual(seen, 1)
+
+        record_stocktake_scans(self.session.id, [{'barcode': '222'}, {'barcode': '333'}], self.manager)
+        self.assertEqual(get_stocktake_version(self.session.id), 2)
+        self.assertEqual(self.changed_since(seen), ['222', '333'])
+        self.assertEqual(self.changed_since(0), ['111', '222', '333'])
+
+    def test_unchanged_count_is_not_a_change(self):
+        update_stocktake_item(self.session.id, '111', 2, self.manager)
+        update_stocktake_item(self.session.id, '111', 2, self.manager)
+        self.assertEqual(get_stocktake_version(self.session.id), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs row locks, sqlite serialises whole transactions")
+class StocktakeConcurrentCountTests(TransactionTestCase):
+    def setUp(self):
+        self.first = make_user('first', manager=True)
+        self.second = make_user('second', manager=True)
+        make_variant('111', stock=5)
+        make_variant('222', stock=5)
+        self.session = start_stocktake(self.first)
+
+    def test_change_committed_late_is_not_skipped(self):
+        counted, release = threading.Event(), threading.Event()
+
+        def slow_counter():
+            #-- counts first, then holds its transaction open
+            try:
+                with transaction.atomic():
+                    update_stocktake_item(self.session.id, '111', 1, self.first)
+                    counted.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def fast_counter():
+            try:
+                update_stocktake_item(self.session.id, '222', 1, self.second)
+            finally:
+                connection.close()
+
+        slow = threading.Thread(target=slow_counter)
+        slow.start()
+        counted.wait(5)
+        fast = threading.Thread(target=fast_counter)
+        fast.start()
+        fast.join(0.5)
+        #-- the second counter waits for the first to commit instead of taking a number ahead of it
+        self.assertTrue(fast.is_alive())
+
+        #-- a device polling now sees nothing committed yet
+        seen = get_stocktake_version(self.session.id)
+        self.assertEqual(list(get_stocktake_items(self.session.id, since=seen)), [])
+
+        release.set()
+        slow.join(5)
+        fast.join(5)
+
+        changed = dict(get_stocktake_items(self.session.id, since=seen).values_list('variant__barcode', 'version'))
+        self.assertEqual(changed, {'111': 1, '222': 2})
+        self.assertEqual(get_stocktake_version(self.session.id), 2)
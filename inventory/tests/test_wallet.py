@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import Customer, WalletTransaction
+from inventory.services import (
+    get_wallet_statement,
+    post_wallet_transaction,
+    process_purchase,
+    record_wallet_deposit,
+)
+
+from .helpers import make_user, make_variant
+
+
+def at(day):
+    return datetime(2030, 1, day, 12, tzinfo=dt_timezone.utc)
+
+
+class WalletLedgerTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.customer = Customer.objects.create(name='Ada', phone='08030000000')
+        make_variant('W1', stock=10)
+
+    def balance(self):
+        self.customer.refresh_from_db()
+        return self.customer.wallet_balance
+
+    def test_debt_sale_then_repayment(self):
+        order = process_purchase(self.user, 'debt', [{'barcode': 'W1', 'quantity': 3}], customer_id=self.customer.id)
+        self.assertEqual(self.balance(), Decimal('-30.00'))
+
+        record_wallet_deposit(self.user, self.customer.id, Decimal('50.00'), note='Cash in')
+        self.assertEqual(self.balance(), Decimal('20.00'))
+
+        entries = list(WalletTransaction.objects.filter(customer=self.customer).order_by('id'))
+        self.assertEqual([(e.kind, e.amount, e.balance_after) for e in entries], [
+            ('debt', Decimal('-30.00'), Decimal('-30.00')),
+            ('deposit', Decimal('50.00'), Decimal('20.00')),
+        ])
+        self.assertEqual(entries[0].order, order)
+
+    def test_wallet_payment_needs_funds(self):
+        record_wallet_deposit(self.user, self.customer.id, Decimal('15.00'))
+
+        with self.assertRaisesMessage(ValidationError, "Insufficient wallet funds"):
+            process_purchase(self.user, 'wallet', [{'barcode': 'W1', 'quantity': 2}], customer_id=self.customer.id)
+        self.assertEqual(self.balance(), Decimal('15.00'))
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+        process_purchase(self.user, 'wallet', [{'barcode': 'W1', 'quantity': 1}], customer_id=self.customer.id)
+        self.assertEqual(self.balance(), Decimal('5.00'))
+
+    def test_rejects_bad_deposits(self):
+        with self.assertRaisesMessage(ValidationError, "must be positive"):
+            record_wallet_deposit(self.user, self.customer.id, Decimal('0'))
+        with self.assertRaisesMessage(ValidationError, "Invalid Customer ID"):
+            record_wallet_deposit(self.user, self.customer.id + 1, Decimal('10.00'))
+
+    def test_statement_opening_and_closing_balances(self):
+        for day, amount in [(1, '100.00'), (5, '-40.00'), (10, '-25.00'), (20, '10.00')]:
+            entry = post_wallet_transaction(self.customer.id, Decimal(amount), 'deposit')
+            WalletTransaction.objects.filter(id=entry.id).update(created_at=at(day))
+
+        statement = get_wallet_statement(self.customer.id, start=at(3), end=at(15))
+        self.assertEqual(statement['opening_balance'], Decimal('100.00'))
+        self.assertEqual(statement['closing_balance'], Decimal('35.00'))
+        self.assertEqual(sorted(e.amount for e in statement['entries']), [Decimal('-40.00'), Decimal('-25.00')])
+
+        #-- a period with no entries carries the balance straight through
+        quiet = get_wallet_statement(self.customer.id, start=at(25), end=at(28))
+        self.assertEqual((quiet['opening_balance'], quiet['closing_balance']), (Decimal('45.00'), Decimal('45.00')))
+
+    def test_statement_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.post(f'/api/customers/{self.customer.id}/wallet/', {'amount': '12.50'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['balance_after'], '12.50')
+
+        today = datetime.now().date()
+        data = self.client.get(
+            f'/api/customers/{self.customer.id}/wallet/?start_date={today - timedelta(days=1)}'
+        ).json()
+        self.assertEqual(Decimal(str(data['opening_balance'])), Decimal('0'))
+        self.assertEqual(Decimal(str(data['closing_balance'])), Decimal('12.50'))
+        self.assertEqual(len(data['results']), 1)
+
+
+class CustomerAdminDepositTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_superuser('owner', password='pass')
+        self.customer = Customer.objects.create(name='Ada', phone='08030000000')
+        post_wallet_transaction(self.customer.id, Decimal('-30.00'), 'debt')
+        self.client.force_login(self.owner)
+
+    def change(self, **extra):
+        data = {'name': 'Ada', 'phone': '08030000000', 'email': '', 'address': '', **extra}
+        return self.client.post(f'/admin/inventory/customer/{self.customer.id}/change/', data)
+
+    def test_repayment_goes_through_the_ledger(self):
+        response = self.change(deposit_amount='20.00', deposit_note='Cash at counter')
+        self.assertEqual(response.status_code, 302)
+
+        entry = WalletTransaction.objects.latest('id')
+        self.assertEqual((entry.kind, entry.amount, entry.balance_after, entry.user),
+                         ('deposit', Decimal('20.00'), Decimal('-10.00'), self.owner))
+        self.assertEqual(entry.note, 'Cash at counter')
+
+    def test_editing_details_leaves_the_balance_alone(self):
+        self.assertEqual(self.change(address='Yaba', wallet_balance='1000').status_code, 302)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.address, self.customer.wallet_balance), ('Yaba', Decimal('-30.00')))
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+
+    def test_rejects_a_non_positive_deposit(self):
+        self.assertEqual(self.change(deposit_amount='-5').status_code, 200)
+        self.assertEqual(WalletTransaction.objects.count(), 1)
@@ -1,16 +1,19 @@
 from django.contrib.auth import views as auth_views
 from django.urls import path
 
-from .views import (ScanItemView, PurchaseView, InventoryAdjustmentView,
+from .views import (PurchaseView, InventoryAdjustmentView,
                     DashboardStatsView, TopSellingProductView,
-                    store_os_view, logout_view, SupplierListView, ProductListView,
-                    PurchaseOrderView, ReceivePurchaseOrderView, RefundView, OrderListView,
-                    PurchaseOrderListView, AuditLogView, BarcodeGeneratorView,
+                    store_os_view, logout_view, SupplierListView,
+                    PurchaseOrderView, ReceivePurchaseOrderView, ReceivePurchaseOrderScanView, RefundView, OrderListView,
+                    PurchaseOrderListView, PurchaseOrderDetailView, PurchaseOrderItemListView, AuditLogView, BarcodeGeneratorView,
                     UserMetaView, StaffActionView, StaffView,
-                    ExportSalesView, ExportInventoryView, DatabaseBackupView, CustomerView,
-                    receipt_view, StocktakeListView, StocktakeDetailView, StoreSettingsView, NotificationView,
+                    ExportSalesView, ExportInventoryView, StockAsOfView, DatabaseBackupView, CustomerWalletView,
+                    DebtorListView,
+                    receipt_view, StocktakeListView, StocktakeDetailView, StocktakeScanView,
+                    StocktakeCountSummaryView, StocktakeItemListView, StoreSettingsView, NotificationView,
                     OrderDetailView, CustomerDetailView, SupplierDetailView, ProductDetailView, StaffDetailView,
-                    SalesReportView, setup_view, ChangePasswordView
+                    SalesReportView, setup_view, ChangePasswordView, event_stream_view, metrics_view,
+                    AsyncScanItemView, AsyncProductListView, AsyncCustomerView, AsyncNotificationView
                     )
 
 urlpatterns = [
@@ -29,13 +32,13 @@ urlpatterns = [
     path('api/staff/<int:user_id>/toggle/', StaffActionView.as_view(), name='staff-toggle'),
 
     # -- POS & Sales
-    path('api/scan/<str:barcode>/', ScanItemView.as_view(), name='scan-item'),
+    path('api/scan/<str:barcode>/', AsyncScanItemView.as_view(), name='scan-item'),
     path('api/purchase/', PurchaseView.as_view(), name='purchase'),
     path('api/orders/', OrderListView.as_view(), name='order-list'),
     path('api/refund/', RefundView.as_view(), name='refund'),
 
     # -- Inventory
-    path('api/products/', ProductListView.as_view(), name='product-list'),
+    path('api/products/', AsyncProductListView.as_view(), name='product-list'),
     path('api/adjust/', InventoryAdjustmentView.as_view(), name='inventory_adjust'),
     path('api/print-labels/', BarcodeGeneratorView.as_view(), name='print-labels'),
 
@@ -43,7 +46,10 @@ urlpatterns = [
     path('api/suppliers/', SupplierListView.as_view(), name='suppliers'),
     path('api/po/create/', PurchaseOrderView.as_view(), name='create-po'),
     path('api/po/list/', PurchaseOrderListView.as_view(), name='po-list'),
+    path('api/po/<int:po_id>/', PurchaseOrderDetailView.as_view(), name='po-detail'),
+    path('api/po/<int:po_id>/items/', PurchaseOrderItemListView.as_view(), name='po-items'),
     path('api/po/<int:po_id>/receive/', ReceivePurchaseOrderView.as_view(), name='receive-po'),
+    path('api/po/<int:po_id>/scan/', ReceivePurchaseOrderScanView.as_view(), name='receive-po-scan'),
 
     # -- Reports & Audit
     path('api/reports/dashboard/', DashboardStatsView.as_view(), name='dashboard-stats'),
@@ -53,10 +59,13 @@ urlpatterns = [
     # EXPORTS & BACKUPS
     path('api/export/sales/', ExportSalesView.as_view(), name='export-sales'),
     path('api/export/inventory/', ExportInventoryView.as_view(), name='export-inventory'),
+    path('api/reports/stock-as-of/', StockAsOfView.as_view(), name='stock-as-of'),
     path('api/backup/', DatabaseBackupView.as_view(), name='backup-db'),
 
     # Customers
-    path('api/customers/', CustomerView.as_view(), name='customers'),
+    path('api/customers/', AsyncCustomerView.as_view(), name='customers'),
+    path('api/customers/debtors/', DebtorListView.as_view(), name='customer-debtors'),
+    path('api/customers/<int:pk>/wallet/', CustomerWalletView.as_view(), name='customer-wallet'),
 
     # __ receipt
     path('print/receipt/<int:order_id>/', receipt_view, name='print-receipt'),
@@ -64,10 +73,15 @@ urlpatterns = [
     # --Stock Taking
     path('api/stocktake/', StocktakeListView.as_view(), name='stocktake-list'),
     path('api/stocktake/<int:pk>/', StocktakeDetailView.as_view(), name='stocktake-detail'),
+    path('api/stocktake/<int:pk>/items/', StocktakeItemListView.as_view(), name='stocktake-items'),
+    path('api/stocktake/<int:pk>/scans/', StocktakeScanView.as_view(), name='stocktake-scans'),
+    path('api/stocktake/<int:pk>/counts/', StocktakeCountSummaryView.as_view(), name='stocktake-counts'),
 
     path('api/settings/', StoreSettingsView.as_view(), name='settings'),
-    path('api/notifications/', NotificationView.as_view(), name='notifications'),
+    path('api/notifications/', AsyncNotificationView.as_view(), name='notifications'),
     path('api/notifications/<int:pk>/read/', NotificationView.as_view(), name='read-notification'),
+    path('api/events/', event_stream_view, name='event-stream'),
+    path('metrics/', metrics_view, name='metrics'),
 
     # -- deletions
     path('api/orders/<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
@@ -107,4 +107,47 @@ def export_inventory_csv(variants):
             asset_value
         ])
         
-    return buffer.getvalue()
\ No newline at end of file
+    return buffer.getvalue()
+
+def export_stock_as_of_csv(variants, as_of):
+    """
+    Generates a CSV of stock and its value on a past date (for the auditors).
+    Expects variants annotated by get_stock_as_of().
+    Columns: SKU, Product, Stock, Cost Price, Total Asset Value
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([f'Stock as of {as_of:%Y-%m-%d %H:%M}'])
+    writer.writerow(['SKU', 'Product', 'Stock', 'Cost Price', 'Total Asset Value'])
+
+    for v in variants.iterator():
+        writer.writerow([
+            v.sku,
+            v.product.name + ' ' + v.name_suffix,
+            v.stock_as_of,
+            v.cost_as_of,
+            v.value_as_of
+        ])
+
+    return buffer.getvalue()
+
+def latency_summary(samples):
+    """
+    Summarises request latencies (seconds) into count and p50/p95/p99/max in milliseconds,
+    nearest rank percentiles, used by the benchmark commands.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+
+    def pct(p):
+        rank = max(1, -(-len(ordered) * p // 100)) #-- ceil without floats
+        return round(ordered[int(rank) - 1] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
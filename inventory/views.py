@@ -1,44 +1,69 @@
 import io
-import traceback
+import logging
+import re
+import secrets
 import uuid
+from datetime import datetime, time, timedelta
 
+from django.conf import settings
 from django.contrib.auth.hashers import check_password
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from os import name
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchQuery, SearchVector
 from django.core.management import call_command
-from django.db.models import Q, ProtectedError, Sum, Count
-from django.http import HttpResponse
+from django.db import connection
+from django.db.models import Q, F, Prefetch, ProtectedError, Sum, Count
+from django.db.models.functions import Coalesce
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.utils.decorators import method_decorator
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.authentication import SessionAuthentication
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 
-from .models import (Supplier, PurchaseOrder, Order, ProductVariant,
-                     InventoryLog, Customer, StocktakeSession, Notification, StoreSettings
+from .models import (Supplier, PurchaseOrder, PurchaseOrderItem, Order, ProductVariant,
+                     InventoryLog, InventoryLogArchive, Customer, StocktakeSession, StocktakeItem, Notification, StoreSettings,
+                     normalize_phone
                      )
-from .permissions import IsManager
+from .events import event_stream
+from .metrics import render_metrics
+from .pagination import (InventoryLogCursorPagination, PurchaseOrderCursorPagination, PurchaseOrderItemCursorPagination,
+                         StocktakeItemCursorPagination, StockAsOfCursorPagination, WalletTransactionCursorPagination,
+                         DebtorCursorPagination
+                         )
+from .permissions import IsManager, is_manager
+from .routers import get_read_alias, read_from_replica
 from .serializers import (ProductVariantSerializer, PurchaseSerializer, InventoryAdjustmentSerializer,
-                          SupplierSerializer, PurchaseOrderSerializer,
-                          CreatePurchaseOrderSerializer,
-                          RefundSerializer, OrderSerializer, InventoryLogSerializer,
+                          SupplierSerializer, PurchaseOrderSerializer, PurchaseOrderItemSerializer,
+                          CreatePurchaseOrderSerializer, ReceiveScanSerializer,
+                          RefundSerializer, OrderSerializer, InventoryLogSerializer, InventoryLogArchiveSerializer,
                           UserSerializer, CreateUserSerializer, CustomerSerializer, StocktakeSessionSerializer,
-                          NotificationSerializer, StoreSettingsSerializer
+                          StocktakeScanBatchSerializer, StocktakeItemSerializer,
+                          NotificationSerializer, StoreSettingsSerializer, StockAsOfSerializer,
+                          WalletTransactionSerializer, WalletDepositSerializer
                           )
 from .services import (get_product_by_barcode, process_purchase, adjust_inventory,
-                       get_dashboard_stats, get_top_selling_items, receive_purchase_order,
+                       get_dashboard_stats, get_top_selling_items, receive_purchase_order, receive_purchase_order_items,
                        process_refund, create_product_and_variant, get_barcode_pdf_buffer,
-                       create_purchase_order, start_stocktake, update_stocktake_item, approve_stocktake
+                       create_purchase_order, start_stocktake, update_stocktake_item, approve_stocktake,
+                       record_stocktake_scans, get_stocktake_count_summary, get_stocktake_items, with_own_counts,
+                       get_stocktake_version, get_stock_as_of, record_wallet_deposit, get_wallet_statement
                        )
-from .utils import export_sales_csv, export_inventory_csv
+from .utils import export_sales_csv, export_inventory_csv, export_stock_as_of_csv
+
+logger = logging.getLogger(__name__)
 
 
 # Create your views here.
@@ -53,7 +78,7 @@ class UserMetaView(APIView):
     def get(self, request):
         return Response({
             "username": request.user.username,
-            "is_manager": request.user.groups.filter(name='Manager').exists() or request.user.is_superuser,
+            "is_manager": is_manager(request.user),
             "is_superuser": request.user.is_superuser
         })
 
@@ -130,6 +155,7 @@ class InventoryAdjustmentView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class DashboardStatsView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -139,6 +165,7 @@ class DashboardStatsView(APIView):
         return Response(stats)
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class TopSellingProductView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -194,6 +221,27 @@ class ReceivePurchaseOrderView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class ReceivePurchaseOrderScanView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, po_id):
+        # -- Body: { items: [{ barcode: "123", quantity: 12 }, ...] }, one call per scan or batch of scans
+        serializer = ReceiveScanSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                purchase_order = receive_purchase_order_items(request.user, po_id, serializer.validated_data['items'])
+                return Response({
+                    "message": "Scan received",
+                    "status": purchase_order.status,
+                    "outstanding_quantity": purchase_order.outstanding_quantity()
+                })
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class RefundView(APIView):
     authentication_classes = [SessionAuthentication]
@@ -207,11 +255,12 @@ class RefundView(APIView):
                                         serializer.validated_data['items'])
                 return Response(result, status=status.HTTP_200_OK)
             except Exception as e:
-                print(traceback.format_exc())
+                logger.exception("Refund of order %s failed", serializer.validated_data['order_id'])
                 return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class OrderListView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
@@ -235,24 +284,26 @@ class OrderListView(APIView):
         return Response(OrderSerializer(orders[:50], many=True).data)
 
 
+def _product_search(query):
+    # -- shared by ProductListView and AsyncProductListView, only active items, limited to 50
+    variants = ProductVariant.objects.select_related('product').filter(is_active=True).order_by('-stock_quantity')
+
+    if query:
+        variants = variants.filter(
+            Q(product__name__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(barcode__icontains=query)
+        )
+    return variants[:50]
+
+
 class ProductListView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):  # -- search functionality
         query = request.query_params.get('search', '')
-        # Only show active items
-        variants = ProductVariant.objects.select_related('product').filter(is_active=True).order_by('-stock_quantity')
-
-        if query:
-            variants = variants.filter(
-                Q(product__name__icontains=query) |
-                Q(sku__icontains=query) |
-                Q(barcode__icontains=query)
-            )
-
-            # -- Pagination, limit to 50
-        return Response(ProductVariantSerializer(variants[:50], many=True).data)
+        return Response(ProductVariantSerializer(_product_search(query), many=True).data)
 
     # -- to create product and variants in a GO
     # -- expected json --> { name, category, price, cost, stock, barcode, sku }, description as an optional fields can be included
@@ -267,46 +318,172 @@ class ProductListView(APIView):
                 }, status=status.HTTP_400_BAD_REQUEST
             )
 
+def _parse_date_param(request, name):
+    # -- None when the param is missing, ValueError when it is malformed or not a real day (e.g 2030-02-30)
+    value = request.query_params.get(name) or ''
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if value and parsed is None:
+        raise ValueError(f"Invalid {name} '{value}', expected a date as YYYY-MM-DD")
+    return parsed
+
+
+def _date_range_bounds(request):
+    # -- turns ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD into aware datetimes for [start, end + 1 day)
+    # -- raises ValueError on a bad date, callers answer 400
+    start_date = _parse_date_param(request, 'start_date')
+    end_date = _parse_date_param(request, 'end_date')
+    start = timezone.make_aware(datetime.combine(start_date, time.min)) if start_date else None
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)) if end_date else None
+    return start, end
+
+
+def _purchase_order_summaries():
+    # -- header fields plus line aggregates in a single query
+    return PurchaseOrder.objects.select_related('supplier').annotate(
+        line_count=Count('items'),
+        outstanding_quantity=Coalesce(Sum(F('items__quantity') - F('items__received_quantity')), 0)
+    )
+
+
+@method_decorator(read_from_replica, name='dispatch')
 class PurchaseOrderListView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        pos = PurchaseOrder.objects.select_related('supplier', 'created_by').order_by('-created_at')[:50]
-        return Response(PurchaseOrderSerializer(pos, many=True).data)
+        pos = _purchase_order_summaries()
+
+        # -- filters, each one backed by an index on PurchaseOrder
+        status_param = request.query_params.get('status')
+        if status_param:
+            pos = pos.filter(status=status_param)
+
+        supplier_param = request.query_params.get('supplier')
+        if supplier_param and supplier_param.isdigit():
+            pos = pos.filter(supplier_id=supplier_param)
+
+        # -- plain range on created_at (not created_at__date) so the index can be used
+        try:
+            start, end = _date_range_bounds(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start:
+            pos = pos.filter(created_at__gte=start)
+        if end:
+            pos = pos.filter(created_at__lt=end)
+
+        paginator = PurchaseOrderCursorPagination()
+        result_page = paginator.paginate_queryset(pos, request, view=self)
+        return paginator.get_paginated_response(PurchaseOrderSerializer(result_page, many=True).data)
+
+
+class PurchaseOrderDetailView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, po_id):
+        try:
+            purchase_order = _purchase_order_summaries().get(id=po_id)
+            return Response(PurchaseOrderSerializer(purchase_order).data)
+        except PurchaseOrder.DoesNotExist:
+            return Response({"error": "Purchase Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+class PurchaseOrderItemListView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, po_id):
+        items = PurchaseOrderItem.objects.select_related('variant__product').filter(purchase_order_id=po_id)
+
+        paginator = PurchaseOrderItemCursorPagination()
+        result_page = paginator.paginate_queryset(items, request, view=self)
+        return paginator.get_paginated_response(PurchaseOrderItemSerializer(result_page, many=True).data)
+
+
+def _audit_search_filter(search):
+    # -- product name or part of a SKU (trigram indexes, migration 0023), exact barcode, part of a username,
+    # -- an action name, or a full text search over the notes ("Order #12", "PO #3", ...).
+    # -- the small tables are searched in subqueries, so every branch on the log table is an indexed lookup
+    variant_ids = ProductVariant.objects.filter(
+        Q(product__name__icontains=search) | Q(sku__icontains=search) | Q(barcode=search)
+    ).values('id')
+    user_ids = User.objects.filter(username__icontains=search).values('id')
+    actions = [value for value, label in InventoryLog.ACTION_CHOICES if search.lower() in (value, label.lower())]
+
+    if connection.vendor == 'postgresql':
+        # -- same expression as the GIN index in migration 0016
+        note_filter = Q(note_search=SearchQuery(search, config='simple', search_type='websearch'))
+    else:
+        note_filter = Q(note__icontains=search)
+
+    return note_filter | Q(variant_id__in=variant_ids) | Q(user_id__in=user_ids) | Q(action__in=actions)
+
+
+@method_decorator(read_from_replica, name='dispatch')
 class AuditLogView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated, IsManager]
 
     def get(self, request):
-        # Base Query
-        logs = InventoryLog.objects.select_related('variant__product', 'user').order_by('-created_at')
+        # -- recent rows live in InventoryLog, older months in InventoryLogArchive (see archive_inventory_logs)
+        # -- archived rows are always older, so we page through the hot table first and then carry on into the archive
+        archived = request.query_params.get('archive') == '1'
+        try:
+            if archived:
+                logs = self._filter(request, InventoryLogArchive.objects.select_related('variant__product', 'user'))
+                serializer_class = InventoryLogArchiveSerializer
+            else:
+                logs = self._filter(request, InventoryLog.objects.select_related('variant__product', 'user'))
+                serializer_class = InventoryLogSerializer
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 4. Keyset Pagination on (created_at, id), no COUNT(*) per page
+        paginator = InventoryLogCursorPagination()
+        result_page = paginator.paginate_queryset(logs, request, view=self)
+        response = paginator.get_paginated_response(serializer_class(result_page, many=True).data)
+
+        # 5. End of the hot table, the next page is the start of the archive
+        if not archived and response.data['next'] is None:
+            if self._filter(request, InventoryLogArchive.objects.all()).exists():
+                url = remove_query_param(request.build_absolute_uri(), paginator.cursor_query_param)
+                response.data['next'] = replace_query_param(url, 'archive', '1')
 
-        # 1. Search Filter
-        search = request.query_params.get('search')
-        if search:
-            logs = logs.filter(
-                Q(variant__product__name__icontains=search) |
-                Q(variant__sku__icontains=search) |
-                Q(user__username__icontains=search) |
-                Q(action__icontains=search) |
-                Q(note__icontains=search)
-            )
+        return response
 
-        # 2. Date Filter
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        if start_date and end_date:
-            logs = logs.filter(created_at__date__range=[start_date, end_date])
+    def _filter(self, request, logs):
+        # 1. Structured Filters, each one backed by an index (on both tables)
+        variant_id = request.query_params.get('variant_id', '')
+        if variant_id.isdigit():
+            logs = logs.filter(variant_id=variant_id)
+
+        user_id = request.query_params.get('user_id', '')
+        if user_id.isdigit():
+            logs = logs.filter(user_id=user_id)
+
+        action = request.query_params.get('action')
+        if action:
+            logs = logs.filter(action=action)
+
+        # 2. Date Filter, a bad date raises ValueError for get() to turn into a 400
+        start, end = _date_range_bounds(request)
+        if start:
+            logs = logs.filter(created_at__gte=start)
+        if end:
+            logs = logs.filter(created_at__lt=end)
+
+        # 3. Search
+        search = request.query_params.get('search', '').strip()
+        if search:
+            if connection.vendor == 'postgresql':
+                logs = logs.alias(note_search=SearchVector('note', config='simple'))
+            logs = logs.filter(_audit_search_filter(search))
 
-        # 3. Pagination Support
-        paginator = PageNumberPagination()
-        paginator.page_size = 20 # Backend chunks
-        result_page = paginator.paginate_queryset(logs, request)
-        serializer = InventoryLogSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return logs
 
 
 class BarcodeGeneratorView(APIView):
@@ -334,15 +511,6 @@ class BarcodeGeneratorView(APIView):
         return response
 
 
-class PurchaseOrderListView(APIView):
-    authentication_classes = [SessionAuthentication]
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        pos = PurchaseOrder.objects.select_related('supplier', 'created_by').order_by('-created_at')[:50]
-        return Response(PurchaseOrderSerializer(pos, many=True).data)
-
-
 # ---------------
 # STAFF MANAGEMENT
 # ---------------
@@ -351,7 +519,7 @@ class StaffView(APIView):
     permission_classes = [IsAuthenticated, IsManager]
 
     def get(self, request):
-        users = User.objects.filter(is_superuser=False).order_by('-date_joined')
+        users = User.objects.filter(is_superuser=False).prefetch_related('groups').order_by('-date_joined')
         return Response(UserSerializer(users, many=True).data)
 
     def post(self, request):
@@ -383,6 +551,7 @@ class StaffActionView(APIView):
             return Response({"error": "User not found"}, status=404)
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class ExportSalesView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated, IsManager]
@@ -399,6 +568,7 @@ class ExportSalesView(APIView):
         return response
 
 
+@method_decorator(read_from_replica, name='dispatch')
 class ExportInventoryView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated, IsManager]
@@ -414,6 +584,44 @@ class ExportInventoryView(APIView):
         return response
 
 
+@method_decorator(read_from_replica, name='dispatch')
+class StockAsOfView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request):
+        # ?date=2025-03-31 -> stock at the end of that day, ?export=csv for the full catalog as a file
+        try:
+            as_of_date = _parse_date_param(request, 'date')
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if not as_of_date:
+            return Response({"error": "date is required (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+
+        as_of = timezone.make_aware(datetime.combine(as_of_date + timedelta(days=1), time.min))
+        checkpoint, variants = get_stock_as_of(as_of)
+
+        if request.query_params.get('export') == 'csv':
+            csv_data = export_stock_as_of_csv(variants, as_of)
+            filename = f"stock_as_of_{as_of_date:%Y%m%d}_{uuid.uuid4().hex[:6].upper()}.csv"
+
+            response = HttpResponse(csv_data, content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        paginator = StockAsOfCursorPagination()
+        result_page = paginator.paginate_queryset(variants, request, view=self)
+        response = paginator.get_paginated_response(StockAsOfSerializer(result_page, many=True).data)
+
+        totals = variants.aggregate(units=Sum('stock_as_of'), value=Sum('value_as_of'))
+        response.data['as_of'] = as_of
+        response.data['checkpoint'] = checkpoint.taken_at if checkpoint else None
+        response.data['total_units'] = totals['units'] or 0
+        response.data['total_value'] = totals['value'] or 0
+        return response
+
+
+@method_decorator(read_from_replica, name='dispatch')
 class DatabaseBackupView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated, IsManager]
@@ -421,7 +629,7 @@ class DatabaseBackupView(APIView):
     def get(self, request):
         # Uses Django's built-in dumpdata command
         buffer = io.StringIO()
-        call_command('dumpdata', 'inventory', stdout=buffer)
+        call_command('dumpdata', 'inventory', database=get_read_alias(), stdout=buffer)
 
         filename = f"backup_{uuid.uuid4().hex[:6].upper()}.json"
 
@@ -430,18 +638,34 @@ class DatabaseBackupView(APIView):
         return response
 
 
+#-- digits plus the punctuation people type in phone numbers, e.g "+234 803-123"
+PHONE_QUERY_RE = re.compile(r'^[\d\s()+-]+$')
+
+
+def _customer_search_filter(search):
+    # -- a phone number is a prefix seek on the normalized column (btree, varchar_pattern_ops on postgres),
+    # -- anything else is a name search, served by the trigram index from migration 0020 on postgres
+    digits = normalize_phone(search)
+    if digits and PHONE_QUERY_RE.match(search):
+        return Q(phone_normalized__startswith=digits)
+    return Q(name__icontains=search)
+
+
+def _customer_search(query):
+    # -- shared by CustomerView and AsyncCustomerView, newest first, limited to 50
+    customers = Customer.objects.all().order_by('-created_at')
+    if query:
+        customers = customers.filter(_customer_search_filter(query))
+    return customers[:50]
+
+
 class CustomerView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]  # Cashiers can view/add customers
 
     def get(self, request):
-        query = request.query_params.get('search', '')
-        customers = Customer.objects.all().order_by('-created_at')
-        if query:
-            customers = customers.filter(
-                Q(name__icontains=query) | Q(phone__icontains=query)
-            )
-        return Response(CustomerSerializer(customers[:50], many=True).data)
+        query = request.query_params.get('search', '').strip()
+        return Response(CustomerSerializer(_customer_search(query), many=True).data)
 
     def post(self, request):
         serializer = CustomerSerializer(data=request.data)
@@ -451,6 +675,36 @@ class CustomerView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+async def event_stream_view(request):
+    """
+    Server-sent events: `notification` (a new Notification row) and `stock` (a variant's new stock level).
+    Plain async view rather than an APIView, DRF views are sync only. Needs the ASGI server (core/asgi.py),
+    under WSGI an endless stream would pin a worker, so we refuse and the client keeps polling.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event stream needs the ASGI server"}, status=503)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' #-- stop nginx style proxies from buffering the stream
+    return response
+
+
+def metrics_view(request):
+    """
+    Prometheus text format for the MetricsMiddleware histograms of this process.
+    Scraper auth is a bearer token (METRICS_TOKEN), people need a manager session.
+    """
+    token = settings.METRICS_TOKEN
+    scraper = bool(token) and secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    if not scraper and not (request.user.is_authenticated and is_manager(request.user)):
+        return JsonResponse({"detail": "You do not have permission to view metrics."}, status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required(login_url='login')
 def receipt_view(request, order_id):
     try:
@@ -477,10 +731,10 @@ def receipt_view(request, order_id):
             else:
                 subtotal_ex_tax += line_total
 
-        settings, _ = StoreSettings.objects.get_or_create(id=1)
+        store_settings = StoreSettings.load()
         context = {
             'order': order,
-            'settings': settings,
+            'settings': store_settings,
             'total_tax': round(total_tax, 2),
             'subtotal': round(subtotal_ex_tax, 2)
         }
@@ -501,7 +755,7 @@ class StocktakeListView(APIView):
     def post(self, request):
         # Start new session
         try:
-            session = start_stocktake(request.user, request.data.get('note', ''))
+            session = start_stocktake(request.user, request.data.get('note', ''), request.data.get('category', ''))
             return Response({"message": "Stocktake Started", "id": session.id}, status=201)
         except Exception as e:
             return Response({"error": str(e)}, status=400)
@@ -512,19 +766,24 @@ class StocktakeDetailView(APIView):
     permission_classes = [IsAuthenticated, IsManager]
 
     def get(self, request, pk):
+        # ?zone= for the counter's own counts (my_count) in that zone
+        items = with_own_counts(StocktakeItem.objects.select_related('variant__product'), request.user,
+                                request.query_params.get('zone', ''))
         try:
-            session = StocktakeSession.objects.prefetch_related('items__variant__product').get(id=pk)
+            session = StocktakeSession.objects.prefetch_related(Prefetch('items', queryset=items)).get(id=pk)
             return Response(StocktakeSessionSerializer(session).data)
         except StocktakeSession.DoesNotExist:
             return Response({"error": "Not found"}, status=404)
 
     def post(self, request, pk):
         # Update count for an item
-        # Body: { barcode: "123", quantity: 50 }
+        # Body: { barcode: "123", quantity: 50 }, quantity is this counter's own count (my_count), not the item total
+        # Optional: zone: "Aisle 4", each counter/zone keeps its own count and the item total is the sum
         barcode = request.data.get('barcode')
         qty = request.data.get('quantity')
+        zone = request.data.get('zone', '')
         try:
-            update_stocktake_item(pk, barcode, qty)
+            update_stocktake_item(pk, barcode, qty, request.user, zone)
             return Response({"message": "Count updated"})
         except Exception as e:
             return Response({"error": str(e)}, status=400)
@@ -553,24 +812,73 @@ class StocktakeDetailView(APIView):
             return Response({"error": "Session not found"}, status=404)
 
 
+class StocktakeItemListView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request, pk):
+        # Paginated items for the handhelds
+        # ?status=uncounted|counted|variance  ?since=<version> for only what changed since the last poll
+        since = request.query_params.get('since')
+        if since is not None and not since.isdigit():
+            return Response({"error": "since must be a version number"}, status=400)
+
+        # -- read the version first, so a change landing while we page is picked up by the next poll
+        version = get_stocktake_version(pk)
+        items = get_stocktake_items(pk, request.query_params.get('status'), int(since) if since else None)
+        items = with_own_counts(items, request.user, request.query_params.get('zone', ''))
+
+        paginator = StocktakeItemCursorPagination()
+        result_page = paginator.paginate_queryset(items, request, view=self)
+        response = paginator.get_paginated_response(StocktakeItemSerializer(result_page, many=True).data)
+        response.data['version'] = version
+        return response
+
+
+class StocktakeScanView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def post(self, request, pk):
+        # Sync a batch of scans in one call
+        # Body: { zone: "Aisle 4", scans: [{ barcode: "123", quantity: 4 }, { barcode: "456" }, ...] }
+        serializer = StocktakeScanBatchSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                result = record_stocktake_scans(pk, serializer.validated_data['scans'],
+                                                request.user, serializer.validated_data['zone'])
+                return Response(result)
+            except Exception as e:
+                return Response({"error": str(e)}, status=400)
+        return Response(serializer.errors, status=400)
+
+
+class StocktakeCountSummaryView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request, pk):
+        return Response(get_stocktake_count_summary(pk))
+
+
 # --- SETTINGS VIEW ---
 class StoreSettingsView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Get or create the singleton record
-        settings, _ = StoreSettings.objects.get_or_create(id=1)
-        return Response(StoreSettingsSerializer(settings).data)
+        # Cached singleton record, created on first use
+        store_settings = StoreSettings.load()
+        return Response(StoreSettingsSerializer(store_settings).data)
 
     def post(self, request):
-        if not (request.user.is_superuser or request.user.groups.filter(name='Manager').exists()):
+        if not is_manager(request.user):
             return Response({
                 "error" : "Permission denied: Managers only"
             }, status = status.HTTP_403_FORBIDDEN)
 
-        settings, _ = StoreSettings.objects.get_or_create(id=1)
-        serializer = StoreSettingsSerializer(settings, data=request.data, partial=True)
+        store_settings = StoreSettings.load()
+        serializer = StoreSettingsSerializer(store_settings, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -578,14 +886,17 @@ class StoreSettingsView(APIView):
 
 
 # --- NOTIFICATIONS VIEW ---
+def _unread_notifications():
+    # Unread notifications, newest first. New ones arrive over /api/events/ so this is only the initial load
+    return Notification.objects.filter(is_read=False).order_by('-created_at')[:50]
+
+
 class NotificationView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated]  # Cashiers can see alerts too? Maybe just managers.
 
     def get(self, request):
-        # Unread notifications
-        notifs = Notification.objects.filter(is_read=False).order_by('-created_at')
-        return Response(NotificationSerializer(notifs, many=True).data)
+        return Response(NotificationSerializer(_unread_notifications(), many=True).data)
 
     def put(self, request, pk):
         # Mark as read
@@ -616,6 +927,68 @@ class OrderDetailView(APIView):
             return Response({"error": "Order not found"}, status=404)
 
 
+#-- sortable columns of the debtors list, each may be prefixed with '-'
+DEBTOR_ORDERINGS = {'wallet_balance', 'debt_0_30', 'debt_31_60', 'debt_over_60', 'lifetime_value', 'order_count'}
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class DebtorListView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def get(self, request):
+        # -- ?ordering=-debt_over_60, default is the biggest debt first (most negative balance)
+        ordering = request.query_params.get('ordering') or 'wallet_balance'
+        if ordering.lstrip('-') not in DEBTOR_ORDERINGS:
+            return Response({"error": f"ordering must be one of {sorted(DEBTOR_ORDERINGS)}"}, status=400)
+
+        debtors = Customer.objects.filter(wallet_balance__lt=0)
+
+        paginator = DebtorCursorPagination()
+        paginator.ordering = (ordering, 'id')
+        result_page = paginator.paginate_queryset(debtors, request, view=self)
+        return paginator.get_paginated_response(CustomerSerializer(result_page, many=True).data)
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class CustomerWalletView(APIView):
+    authentication_classes = [SessionAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        # -- statement: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD, newest entries first
+        if not Customer.objects.filter(id=pk).exists():
+            return Response({"error": "Customer not found"}, status=404)
+
+        try:
+            start, end = _date_range_bounds(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        statement = get_wallet_statement(pk, start, end)
+
+        paginator = WalletTransactionCursorPagination()
+        result_page = paginator.paginate_queryset(statement['entries'], request, view=self)
+        response = paginator.get_paginated_response(WalletTransactionSerializer(result_page, many=True).data)
+        response.data['opening_balance'] = statement['opening_balance']
+        response.data['closing_balance'] = statement['closing_balance']
+        return response
+
+    def post(self, request, pk):
+        # -- customer pays in: store credit top up or debt repayment
+        serializer = WalletDepositSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                entry = record_wallet_deposit(
+                    request.user, pk,
+                    serializer.validated_data['amount'],
+                    serializer.validated_data['note']
+                )
+                return Response(WalletTransactionSerializer(entry).data, status=status.HTTP_201_CREATED)
+            except Exception as e:
+                return Response({"error": str(e)}, status=400)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 #-- DELETE CUSTOMERS
 class CustomerDetailView(APIView):
     authentication_classes = [SessionAuthentication]
@@ -625,7 +998,7 @@ class CustomerDetailView(APIView):
         try:
             customer = Customer.objects.get(id=pk)
             #-- Don't delete if they owe us money or have history
-            if customer.orders.exists():
+            if customer.orders.exists() or customer.wallet_transactions.exists():
                 return Response({"error": "Cannot delete customer with transaction history."}, status=400)
 
             customer.delete()
@@ -690,6 +1063,7 @@ class StaffDetailView(APIView):
                 "error": "Cannot delete staff member who has created orders or logs. Please deactivate them instead."
             }, status=400)
 
+@method_decorator(read_from_replica, name='dispatch')
 class SalesReportView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = [IsAuthenticated, IsManager]
@@ -740,10 +1114,10 @@ def setup_view(request):
         User.objects.create_superuser(username=username, password=password)
 
         # Create Default Settings
-        settings, _ = StoreSettings.objects.get_or_create(id=1)
+        store_settings = StoreSettings.load()
         if store_name:
-            settings.store_name = store_name
-            settings.save()
+            store_settings.store_name = store_name
+            store_settings.save()
 
         return redirect('login')
 
@@ -779,3 +1153,61 @@ def store_os_view(request):
 def logout_view(request):
     logout(request)
     return redirect('login')
+
+
+# -- ASYNC READ ENDPOINTS
+# -- the till's hot reads. Under the ASGI server (core/asgi.py) the GET never waits for a thread, so a slow
+# -- export or PDF running in the sync thread pool cannot queue scans behind it. Writes keep their DRF views.
+
+class AsyncReadView(View):
+    """
+    GET is handled by the async `get` with the async ORM, every other method is handed to the DRF view in
+    `fallback` on a worker thread, so writes keep their DRF authentication, CSRF checks and validation.
+    Under WSGI Django runs the async GET through async_to_sync, so both deployment modes keep working.
+    The queries themselves live in helpers (_product_search, _customer_search...) that the fallback's own get uses too.
+    """
+    fallback = None #-- DRF APIView handling the non GET methods
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return await sync_to_async(self.fallback.as_view())(request, *args, **kwargs)
+
+        #-- same outcome as SessionAuthentication + IsAuthenticated on the DRF views
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+        return await self.get(request, *args, **kwargs)
+
+
+class AsyncScanItemView(AsyncReadView):
+    fallback = ScanItemView
+
+    async def get(self, request, barcode):
+        variant = await sync_to_async(get_product_by_barcode)(barcode)
+        if not variant:
+            return JsonResponse({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse(ProductVariantSerializer(variant).data)
+
+
+class AsyncProductListView(AsyncReadView):
+    fallback = ProductListView
+
+    async def get(self, request):
+        variants = [variant async for variant in _product_search(request.GET.get('search', ''))]
+        return JsonResponse(ProductVariantSerializer(variants, many=True).data, safe=False)
+
+
+class AsyncCustomerView(AsyncReadView):
+    fallback = CustomerView
+
+    async def get(self, request):
+        customers = [customer async for customer in _customer_search(request.GET.get('search', '').strip())]
+        return JsonResponse(CustomerSerializer(customers, many=True).data, safe=False)
+
+
+class AsyncNotificationView(AsyncReadView):
+    fallback = NotificationView
+
+    async def get(self, request):
+        notifs = [notif async for notif in _unread_notifications()]
+        return JsonResponse(NotificationSerializer(notifs, many=True).data, safe=False)